@@ -6,6 +6,41 @@ Automatically generated by Colaboratory.
 Original file is located at
     https://colab.research.google.com/drive/1e10fS9x-i18xCkazCskL6ekXNWHnmNRo
 """
+import contextlib
+import logging
+import sys
+
+
+@contextlib.contextmanager
+def verbose_logging(logger, enabled):
+    """
+    Route logger's debug diagnostics to stdout for the duration of one
+    Solver(verbose=True) call; its level and handlers are restored afterwards.
+    """
+    if not enabled:
+        yield
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    level = logger.level
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(handler)
+    try:
+        yield
+    finally:
+        logger.removeHandler(handler)
+        logger.setLevel(level)
+
+
+def apply_time_limit(solver, time_limit, deterministic=False):
+    """Cap a CP-SAT solver's search at time_limit seconds (None => no limit)."""
+    if time_limit is None:
+        return
+    # wall-clock budget, or CP-SAT's reproducible work units if deterministic
+    if deterministic:
+        solver.parameters.max_deterministic_time = float(time_limit)
+    else:
+        solver.parameters.max_time_in_seconds = float(time_limit)
+
 
 def transform_output(d):
     crlf = '\r\n'
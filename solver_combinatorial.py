@@ -1,8 +1,24 @@
+import logging
 import os
 import re
-from time import time as currenttime
+from time import perf_counter_ns
 from ortools.sat.python import cp_model
+from helper import apply_time_limit, verbose_logging
 import itertools
+from collections import defaultdict
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Above this many allowed tuples a One-team constraint is encoded with team
+# selector Booleans instead of an explicit AddAllowedAssignments table.
+MAX_ONE_TEAM_TUPLES = 10000
+
+# One-team line patterns, compiled once at import
+_STEP_RE = re.compile(r's(\d+)')
+_TEAM_RE = re.compile(r'\(([^)]+)\)')
+_USER_RE = re.compile(r'u(\d+)')
+
 
 def parse_file(filename):
     with open(filename, 'r') as file:
@@ -17,6 +33,9 @@ def parse_file(filename):
     user_capacity_constraints = []
     for line in lines[3:]:
         line = line.strip()
+        if not line or line.startswith('#'):
+            # blank or comment line
+            continue
         if line.startswith("User-capacity"):
             parts = line.split()
             user = int(parts[1][1:])
@@ -28,16 +47,79 @@ def parse_file(filename):
     return steps_count, users_count, constraints, user_capacity_constraints
 
 
-def Solver(filename, max_solutions=1, progress_callback=None, **kwargs):
+def _post_value_precedence(model, steps, is_user, group):
     """
-    :param filename: Path to the input file.
-    :param max_solutions: Number of solutions to retrieve (>=1). Default=1 => single solution.
-    :param progress_callback: Optional callback for progress (unused here).
-    :param kwargs: Additional arguments (unused).
+    For consecutive users a < b of `group`, b may only take a step once a
+    has taken an earlier one. `is_user(s, u)` gives the literal for
+    "step s is assigned to u"; `steps` is the ordered list of steps they share.
+    """
+    for u_a, u_b in zip(group, group[1:]):
+        # seen_a => u_a holds one of the steps up to and including the current one
+        seen_a = None
+        for st in steps:
+            x_a = is_user(st, u_a)
+            x_b = is_user(st, u_b)
+            if seen_a is None:
+                model.AddBoolOr([x_b.Not()])
+            else:
+                model.AddImplication(x_b, seen_a)
+            nxt = model.NewBoolVar(f'seen_u{u_a}_s{st + 1}')
+            model.AddImplication(x_a, nxt)
+            if seen_a is None:
+                model.AddImplication(nxt, x_a)
+            else:
+                model.AddImplication(seen_a, nxt)
+                model.AddBoolOr([nxt.Not(), x_a, seen_a])
+            seen_a = nxt
+
+
+def _break_user_symmetry(model, assignments, steps_count, users_count, user_authorisations,
+                         user_capacity_constraints, one_team_constraints):
+    """
+    Users with the same authorisations, capacity and One-team memberships are
+    interchangeable; order each such group by first use so CP-SAT only
+    explores one representative of every permutation. Only sound when a
+    single solution is requested, since it removes symmetric solutions.
+    """
+    full_mask = ((1 << steps_count) - 1) << 1
+    caps = defaultdict(list)
+    for (u, cap) in user_capacity_constraints:
+        caps[u].append(cap)
+    memberships = defaultdict(set)
+    for ci, otc in enumerate(one_team_constraints):
+        for ti, tm in enumerate(otc['teams']):
+            for u in tm:
+                memberships[u].add((ci, ti))
+
+    groups = defaultdict(list)
+    for u in range(1, users_count + 1):
+        mask = user_authorisations.get(u, full_mask) & full_mask
+        if mask:
+            groups[(mask, tuple(sorted(caps[u])), frozenset(memberships[u]))].append(u)
+
+    eq = {}
+
+    def is_user(st, u):
+        if (st, u) not in eq:
+            b = model.NewBoolVar(f'is_u{u}_s{st + 1}')
+            model.Add(assignments[st] == u).OnlyEnforceIf(b)
+            model.Add(assignments[st] != u).OnlyEnforceIf(b.Not())
+            eq[(st, u)] = b
+        return eq[(st, u)]
+
+    for (mask, _, _), group in groups.items():
+        if len(group) > 1:
+            steps = [st for st in range(steps_count) if (mask >> (st + 1)) & 1]
+            _post_value_precedence(model, steps, is_user, group)
+
+
+def _build_model(model, steps_count, users_count, constraints, user_capacity_constraints,
+                 break_symmetry=False):
+    """
+    Post all constraints of a parsed instance onto `model`.
+    :param break_symmetry: Also order interchangeable users (single-solution search only).
+    :return: One IntVar per step whose value is the assigned user id.
     """
-    model = cp_model.CpModel()
-    steps_count, users_count, constraints, user_capacity_constraints = parse_file(filename)
-    
     # Create variables: one for each step
     assignments = [model.NewIntVar(1, users_count, f'step_{i + 1}') for i in range(steps_count)]
     
@@ -52,30 +134,33 @@ def Solver(filename, max_solutions=1, progress_callback=None, **kwargs):
             user = int(parts[1][1:])
             allowed_steps = [int(step[1:]) for step in parts[2:]]
             if user in user_authorisations:
-                print(f"Warning: User u{user} has multiple authorisations; ignoring duplicates.")
+                logger.warning("User u%s has multiple authorisations; ignoring duplicates.", user)
                 continue
-            user_authorisations[user] = allowed_steps
+            # bit s set <=> user may perform step s (1-based)
+            auth_mask = 0
+            for st in allowed_steps:
+                auth_mask |= 1 << st
+            user_authorisations[user] = auth_mask
             for st_index in range(steps_count):
-                if (st_index + 1) not in allowed_steps:
+                if not (auth_mask >> (st_index + 1)) & 1:
                     model.Add(assignments[st_index] != user)
-            print(f"Applied Authorisation constraint for user u{user} on steps {allowed_steps}")
+            logger.debug("Applied Authorisation constraint for user u%s on steps %s", user, allowed_steps)
 
         elif parts[0] == "Separation-of-duty":
             s1, s2 = int(parts[1][1:]), int(parts[2][1:])
             model.Add(assignments[s1 - 1] != assignments[s2 - 1])
-            print(f"Applied Separation-of-duty between s{s1} and s{s2}")
+            logger.debug("Applied Separation-of-duty between s%s and s%s", s1, s2)
 
         elif parts[0] == "Binding-of-duty":
             s1, s2 = int(parts[1][1:]), int(parts[2][1:])
             model.Add(assignments[s1 - 1] == assignments[s2 - 1])
-            print(f"Applied Binding-of-duty between s{s1} and s{s2}")
+            logger.debug("Applied Binding-of-duty between s%s and s%s", s1, s2)
 
         elif parts[0] == "At-most-k":
             k = int(parts[1])
             step_indices = [int(s[1:]) - 1 for s in parts[2:]]
             if k < len(step_indices):
                 # Combinatorial approach: for each combination of k+1 steps, force at least one pair same user
-                import itertools
                 for combo in itertools.combinations(step_indices, k + 1):
                     bools_same = []
                     for i, j in itertools.combinations(combo, 2):
@@ -84,46 +169,58 @@ def Solver(filename, max_solutions=1, progress_callback=None, **kwargs):
                         model.Add(assignments[i] != assignments[j]).OnlyEnforceIf(b.Not())
                         bools_same.append(b)
                     model.AddBoolOr(bools_same)
-                print(f"Applied At-most-k = {k} on steps {[s+1 for s in step_indices]}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Applied At-most-k = %s on steps %s", k, [s+1 for s in step_indices])
             else:
-                print(f"Ignored At-most-k with k >= #steps_in_constraint => no effect")
+                logger.debug("Ignored At-most-k with k >= #steps_in_constraint => no effect")
 
         elif parts[0] == "One-team":
             # Parse steps and teams
             line = constraint
-            st = re.findall(r's(\d+)', line)
+            st = _STEP_RE.findall(line)
             group_steps = [int(x) for x in st]
-            teams_raw = re.findall(r'\(([^)]+)\)', line)
+            teams_raw = _TEAM_RE.findall(line)
             team_groups = []
             for team_str in teams_raw:
-                us = re.findall(r'u(\d+)', team_str)
+                us = _USER_RE.findall(team_str)
                 team_groups.append([int(u) for u in us])
             if not group_steps or not team_groups:
-                print(f"Warning: Unable to parse One-team: {line}")
+                logger.warning("Unable to parse One-team: %s", line)
                 continue
             one_team_constraints.append({
                 'steps': group_steps,
                 'teams': team_groups,
             })
-            print(f"Parsed One-team for steps {group_steps} with teams {team_groups}")
+            logger.debug("Parsed One-team for steps %s with teams %s", group_steps, team_groups)
 
     # ---------- Process One-Team constraints ----------
     for idx, otc in enumerate(one_team_constraints):
         stps = otc['steps']
         tms = otc['teams']
         step_vars = [assignments[s-1] for s in stps]
-        allowed = []
-        import itertools
+        if sum(len(tm) ** len(stps) for tm in tms) > MAX_ONE_TEAM_TUPLES:
+            # table would be too large: pick one team via a selector and
+            # restrict each step's domain to it instead of listing tuples
+            team_vars = [model.NewBoolVar(f'oneteam_{idx}_team_{t}') for t in range(len(tms))]
+            model.AddExactlyOne(team_vars)
+            for tm, team_var in zip(tms, team_vars):
+                team_domain = cp_model.Domain.FromValues(tm)
+                for var in step_vars:
+                    model.AddLinearExpressionInDomain(var, team_domain).OnlyEnforceIf(team_var)
+            logger.debug("Applied One-team (team selectors) for steps %s", stps)
+            continue
+        # every team contributes |team|^|steps| rows; build them as one int32 block
+        rows = []
         for tm in tms:
-            for combo in itertools.product(tm, repeat=len(stps)):
-                allowed.append(combo)
-        model.AddAllowedAssignments(step_vars, allowed)
-        print(f"Applied One-team for steps {stps}")
-
-    # ---------- user_authorisations fallback ----------
-    for u in range(1, users_count + 1):
-        if u not in user_authorisations:
-            print(f"User u{u} => no specific authorisations => can do any step")
+            tm_arr = np.array(tm, dtype=np.int32)
+            grid = np.stack(np.meshgrid(*([tm_arr] * len(stps)), indexing='ij'), axis=-1)
+            rows.append(grid.reshape(-1, len(stps)))
+        allowed = np.concatenate(rows, axis=0)
+        # the table proto stores tuples flattened row-major, so fill it directly
+        # rather than round-tripping every row through a Python tuple
+        ct = model.AddAllowedAssignments(step_vars, [])
+        ct.proto.table.values.extend(allowed.ravel().tolist())
+        logger.debug("Applied One-team for steps %s", stps)
 
     # ---------- user-capacity constraints ----------
     for (u, cap) in user_capacity_constraints:
@@ -134,57 +231,100 @@ def Solver(filename, max_solutions=1, progress_callback=None, **kwargs):
             model.Add(assignments[st] != u).OnlyEnforceIf(b.Not())
             bool_list.append(b)
         model.Add(sum(bool_list) <= cap)
-        print(f"Applied user capacity: user u{u} <= {cap} steps")
-
-    # ---------- Solve (single or multi) ----------
-    solver = cp_model.CpSolver()
-    start_ms = int(currenttime() * 1000)
-    all_solutions = []
-
-    class MultiSolCallback(cp_model.CpSolverSolutionCallback):
-        def __init__(self, vars_, limit):
-            cp_model.CpSolverSolutionCallback.__init__(self)
-            self._vars = vars_
-            self._limit = limit
-            self._count = 0
-
-        def on_solution_callback(self):
-            if self._count >= self._limit:
-                self.StopSearch()
-                return
-            self._count += 1
-            one_sol = []
-            for i, var in enumerate(self._vars):
-                one_sol.append(f"s{i+1}: u{self.Value(var)}")
-            all_solutions.append(one_sol)
-
-    collector = MultiSolCallback(assignments, max_solutions)
-    status = solver.SearchForAllSolutions(model, collector)
-    end_ms = int(currenttime() * 1000)
-
-    d = {
-        'sat': 'unsat',
-        'sol': [],
-        'mul_sol': '',
-        'exe_time': f"{end_ms - start_ms}ms"
-    }
-
-    if len(all_solutions) > 0:
-        d['sat'] = 'sat'
-        # first solution
-        d['sol'] = all_solutions[0]
-        if len(all_solutions) == 1:
-            # only one solution found
-            d['mul_sol'] = "Unique solution found" if status == cp_model.OPTIMAL else "1 solution found"
+        logger.debug("Applied user capacity: user u%s <= %s steps", u, cap)
+
+    # ---------- symmetry breaking between interchangeable users ----------
+    if break_symmetry:
+        _break_user_symmetry(model, assignments, steps_count, users_count, user_authorisations,
+                             user_capacity_constraints, one_team_constraints)
+
+    return assignments
+
+
+def Solver(filename, max_solutions=1, progress_callback=None, verbose=False,
+           time_limit=None, deterministic=False, workers=None, **kwargs):
+    """
+    :param filename: Path to the input file.
+    :param max_solutions: Number of solutions to retrieve (>=1). Default=1 => single solution.
+    :param progress_callback: Optional callback for progress (unused here).
+    :param verbose: Log per-constraint diagnostics to stdout (module logger at DEBUG).
+    :param time_limit: Optional search time limit in seconds (None => no limit). A search stopped
+        before any solution or proof of infeasibility reports sat='unknown'.
+    :param deterministic: Interpret time_limit as CP-SAT deterministic time instead of wall-clock.
+    :param workers: CP-SAT portfolio workers for single-solution search (None => one per CPU).
+    :param kwargs: Additional arguments (unused).
+    """
+    with verbose_logging(logger, verbose):
+        model = cp_model.CpModel()
+        steps_count, users_count, constraints, user_capacity_constraints = parse_file(filename)
+        assignments = _build_model(model, steps_count, users_count, constraints,
+                                   user_capacity_constraints,
+                                   break_symmetry=max_solutions <= 1)
+
+        # ---------- Solve (single or multi) ----------
+        solver = cp_model.CpSolver()
+        apply_time_limit(solver, time_limit, deterministic)
+        if max_solutions <= 1:
+            # pure feasibility: stop at the first solution found by any worker
+            solver.parameters.stop_after_first_solution = True
+            solver.parameters.num_search_workers = workers or os.cpu_count() or 8
         else:
-            # multiple
-            blocks = []
-            for idx, sol_list in enumerate(all_solutions, start=1):
-                blocks.append(f"Solution {idx}:\n" + "\n".join(sol_list))
-            d['mul_sol'] = "\n\n".join(blocks)
-
-    print("Solver status:", solver.StatusName(status))
-    return d
+            # enumeration only runs on a single worker
+            solver.parameters.enumerate_all_solutions = True
+            solver.parameters.num_search_workers = 1
+        start_ns = perf_counter_ns()
+        all_solutions = []
+
+        class MultiSolCallback(cp_model.CpSolverSolutionCallback):
+            def __init__(self, vars_, limit):
+                cp_model.CpSolverSolutionCallback.__init__(self)
+                self._vars = vars_
+                self._limit = limit
+                self._count = 0
+
+            def on_solution_callback(self):
+                self._count += 1
+                # store raw user ids; formatting is deferred until search is over
+                all_solutions.append([self.Value(var) for var in self._vars])
+                # stop on the last requested solution rather than the one after it
+                if self._count >= self._limit:
+                    self.StopSearch()
+
+        collector = MultiSolCallback(assignments, max_solutions)
+        status = solver.Solve(model, collector)
+        elapsed_ms = (perf_counter_ns() - start_ns) // 1_000_000
+
+        d = {
+            'sat': 'unsat',
+            'sol': [],
+            'mul_sol': '',
+            'exe_time': f"{elapsed_ms}ms"
+        }
+
+        all_solutions = [[f"s{i+1}: u{u}" for i, u in enumerate(users)] for users in all_solutions]
+        if len(all_solutions) > 0:
+            d['sat'] = 'sat'
+            # first solution
+            d['sol'] = all_solutions[0]
+            if len(all_solutions) == 1:
+                # only one solution found; it is unique only if a full enumeration
+                # finished (single-solution search stops at the first one with OPTIMAL)
+                if max_solutions > 1 and status == cp_model.OPTIMAL:
+                    d['mul_sol'] = "Unique solution found"
+                else:
+                    d['mul_sol'] = "1 solution found"
+            else:
+                # multiple
+                blocks = []
+                for idx, sol_list in enumerate(all_solutions, start=1):
+                    blocks.append(f"Solution {idx}:\n" + "\n".join(sol_list))
+                d['mul_sol'] = "\n\n".join(blocks)
+        elif status != cp_model.INFEASIBLE:
+            # stopped (e.g. by time_limit) before finding a solution or proving there is none
+            d['sat'] = 'unknown'
+
+        logger.debug("Solver status: %s", solver.StatusName(status))
+        return d
 
 
 if __name__ == '__main__':
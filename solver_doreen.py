@@ -1,10 +1,25 @@
-from z3 import *
-from time import time as currenttime
+from time import perf_counter_ns
+import functools
+import logging
 import os
 import re
-import numpy
-# We see also from the code: from ortools.sat.python import cp_model (but not necessarily used fully).
+from collections import defaultdict
 from ortools.sat.python import cp_model
+from helper import apply_time_limit, verbose_logging
+
+logger = logging.getLogger(__name__)
+
+# constraint line patterns, compiled once instead of on every parsed line
+_RE_HEADER = re.compile(r'(#\w+):\s*(\d+)$')
+_RE_AUTH = re.compile(r"Authorisations u(\d+)(?: s\d+)*")
+_RE_SOD = re.compile(r'Separation-of-duty s(\d+) s(\d+)')
+_RE_BOD = re.compile(r'Binding-of-duty s(\d+) s(\d+)')
+_RE_AMK = re.compile(r'At-most-k (\d+) (s\d+)(?: (s\d+))*')
+_RE_OT = re.compile(r'One-team\s+(s\d+)(?: s\d+)* (\((u\d+)*\))*')
+_RE_UC = re.compile(r'User-capacity u(\d+) (\d+)')
+_RE_TEAM = re.compile(r'\((u\d+\s*)+\)')
+_RE_S = re.compile(r's(\d+)')
+_RE_U = re.compile(r'u(\d+)')
 
 def transform_output(d):
     crlf = '\r\n'
@@ -26,218 +41,324 @@ class Instance:
         self.one_team = []
         self.user_capacity = []
 
+def _parse_auth(l, instance):
+    m = _RE_AUTH.match(l)
+    if not m:
+        return False
+    # no steps listed => [-1], i.e. the user may not do any step
+    steps_ = [int(x) - 1 for x in _RE_S.findall(l)] or [-1]
+    instance.auth[int(m.group(1)) - 1].extend(steps_)
+    return True
+
+def _parse_sod(l, instance):
+    m = _RE_SOD.match(l)
+    if not m:
+        return False
+    instance.SOD.append((int(m.group(1)) - 1, int(m.group(2)) - 1))
+    return True
+
+def _parse_bod(l, instance):
+    m = _RE_BOD.match(l)
+    if not m:
+        return False
+    instance.BOD.append((int(m.group(1)) - 1, int(m.group(2)) - 1))
+    return True
+
+def _parse_at_most_k(l, instance):
+    m = _RE_AMK.match(l)
+    if not m:
+        return False
+    stp = [int(x) - 1 for x in _RE_S.findall(l)]
+    instance.at_most_k.append((int(m.group(1)), stp))
+    return True
+
+def _parse_one_team(l, instance):
+    if not _RE_OT.match(l):
+        return False
+    stp = [int(x) - 1 for x in _RE_S.findall(l)]
+    tms = [[int(x) - 1 for x in _RE_U.findall(mm.group(0))] for mm in _RE_TEAM.finditer(l)]
+    instance.one_team.append((stp, tms))
+    return True
+
+def _parse_user_capacity(l, instance):
+    m = _RE_UC.match(l)
+    if not m:
+        return False
+    instance.user_capacity.append((int(m.group(1)) - 1, int(m.group(2))))
+    return True
+
+# constraint keyword => line parser; each returns False if the line is malformed
+_CONSTRAINT_PARSERS = {
+    'Authorisations': _parse_auth,
+    'Separation-of-duty': _parse_sod,
+    'Binding-of-duty': _parse_bod,
+    'At-most-k': _parse_at_most_k,
+    'One-team': _parse_one_team,
+    'User-capacity': _parse_user_capacity,
+}
+
 def parse_file(filename):
+    """Parse an instance file, reusing the cached Instance while the file is unchanged.
+
+    The returned Instance is shared between calls and must not be mutated.
+    """
+    st = os.stat(filename)
+    return _parse_file_cached(os.path.abspath(filename), st.st_mtime_ns, st.st_size)
+
+@functools.lru_cache(maxsize=1024)
+def _parse_file_cached(filename, mtime_ns, size):
+    # mtime_ns/size only key the cache so a rewritten file is parsed again
+    return _read_instance(filename)
+
+def _read_instance(filename):
     def read_attribute(name):
-        line = f.readline()
-        match = re.match(f'{name}:\\s*(\\d+)$', line)
-        if match:
-            return int(match.group(1))
+        line = next(lines, '')
+        match = _RE_HEADER.match(line)
+        if match and match.group(1) == name:
+            return int(match.group(2))
         else:
             raise Exception(f"Failed parse line {line}, expected {name}")
 
+    # one buffered read, then walk the lines in memory
+    with open(filename, 'rb') as f:
+        lines = iter(f.read().decode().splitlines())
+
     instance = Instance()
-    with open(filename) as f:
-        instance.number_of_steps = read_attribute("#Steps")
-        instance.number_of_users = read_attribute("#Users")
-        instance.number_of_constraints = read_attribute("#Constraints")
-        instance.auth = [[] for _ in range(instance.number_of_users)]
-        for _ in range(instance.number_of_constraints):
-            l = f.readline().strip()
-            # parse each constraint
-            m = re.match(r"Authorisations u(\d+)(?: s\d+)*", l)
-            if m:
-                u = int(m.group(1))
-                steps_ = [-1]
-                for mm in re.finditer(r's(\d+)', l):
-                    if -1 in steps_:
-                        steps_.remove(-1)
-                    steps_.append(int(mm.group(1)) - 1)
-                instance.auth[u-1].extend(steps_)
-                continue
-            m = re.match(r'Separation-of-duty s(\d+) s(\d+)', l)
-            if m:
-                s1 = int(m.group(1)) - 1
-                s2 = int(m.group(2)) - 1
-                instance.SOD.append((s1, s2))
-                continue
-            m = re.match(r'Binding-of-duty s(\d+) s(\d+)', l)
-            if m:
-                s1 = int(m.group(1)) - 1
-                s2 = int(m.group(2)) - 1
-                instance.BOD.append((s1, s2))
-                continue
-            m = re.match(r'At-most-k (\d+) (s\d+)(?: (s\d+))*', l)
-            if m:
-                k = int(m.group(1))
-                stp = []
-                for mm in re.finditer(r's(\d+)', l):
-                    stp.append(int(mm.group(1)) - 1)
-                instance.at_most_k.append((k, stp))
-                continue
-            m = re.match(r'One-team\s+(s\d+)(?: s\d+)* (\((u\d+)*\))*', l)
-            if m:
-                stp = []
-                for mm in re.finditer(r's(\d+)', l):
-                    stp.append(int(mm.group(1)) - 1)
-                tms = []
-                for mm in re.finditer(r'\((u\d+\s*)+\)', l):
-                    t_ = []
-                    for us in re.finditer(r'u(\d+)', mm.group(0)):
-                        t_.append(int(us.group(1)) - 1)
-                    tms.append(t_)
-                instance.one_team.append((stp, tms))
-                continue
-            m = re.match(r'User-capacity u(\d+) (\d+)', l)
-            if m:
-                uid = int(m.group(1)) - 1
-                cap = int(m.group(2))
-                instance.user_capacity.append((uid, cap))
-                continue
-            else:
-                raise Exception(f"Cannot parse line => {l}")
+    instance.number_of_steps = read_attribute("#Steps")
+    instance.number_of_users = read_attribute("#Users")
+    instance.number_of_constraints = read_attribute("#Constraints")
+    instance.auth = [[] for _ in range(instance.number_of_users)]
+    # blank and comment lines don't count towards #Constraints
+    constraint_lines = (l for l in map(str.strip, lines) if l and not l.startswith('#'))
+    for _ in range(instance.number_of_constraints):
+        l = next(constraint_lines, '')
+        # dispatch on the leading keyword => one regex per line
+        parse = _CONSTRAINT_PARSERS.get(l.split(None, 1)[0] if l else None)
+        if parse is None or not parse(l, instance):
+            raise Exception(f"Cannot parse line => {l}")
     return instance
 
 
-def Solver(filename, max_solutions=1, **kwargs):
+def Solver(filename, max_solutions=1, verbose=False, time_limit=None, deterministic=False, workers=None,
+           **kwargs):
     """
     :param filename: path to constraint
     :param max_solutions: number of solutions to find (1 => single solution)
+    :param verbose: log the parsed instance to stdout (module logger at DEBUG)
+    :param time_limit: optional search limit in seconds (None => no limit); a search stopped
+        before any solution or proof of infeasibility reports sat='unknown'
+    :param deterministic: use time_limit as deterministic time instead of wall-clock
+    :param workers: CP-SAT workers for single-solution search (None => one per CPU)
     """
-    instance = parse_file(filename)
-    print("=====================================================")
-    print(f"File: {filename}")
-    print(f"Steps: {instance.number_of_steps}, Users: {instance.number_of_users}, Constraints: {instance.number_of_constraints}")
-    print(f"Auth: {instance.auth}")
-    print(f"SOD: {instance.SOD}")
-    print(f"BOD: {instance.BOD}")
-    print(f"At-most-k: {instance.at_most_k}")
-    print(f"One-team: {instance.one_team}")
-    print(f"User-capacity: {instance.user_capacity}")
-    print("=====================================================")
-
-    start_time = currenttime() * 1000.0
-
-    # We'll do a CP approach for enumerating solutions (like we did in the older partial code).
-    from ortools.sat.python import cp_model
-    model = cp_model.CpModel()
-
-    # user_assignment[s][u] = bool => step s is assigned to user u
-    user_assignment = [[model.NewBoolVar(f's{s+1}_u{u+1}')
-                        for u in range(instance.number_of_users)]
-                       for s in range(instance.number_of_steps)]
-    # each step exactly 1 user
-    for s in range(instance.number_of_steps):
-        model.AddExactlyOne(user_assignment[s][u] for u in range(instance.number_of_users))
-
-    # Auth
-    for u, stp_list in enumerate(instance.auth):
-        if len(stp_list) == 1 and stp_list[0] == -1:
-            # means no steps allowed
-            # => user cannot be assigned to any step
-            for s in range(instance.number_of_steps):
-                model.Add(user_assignment[s][u] == 0)
-        elif len(stp_list) > 0:
-            # those steps are allowed, the rest are not
-            allowed_set = set(stp_list)
-            for s in range(instance.number_of_steps):
-                if s not in allowed_set:
-                    model.Add(user_assignment[s][u] == 0)
-
-    # SOD
-    for (s1, s2) in instance.SOD:
-        for u in range(instance.number_of_users):
-            model.Add(user_assignment[s2][u] == 0).OnlyEnforceIf(user_assignment[s1][u])
-
-    # BOD
-    for (s1, s2) in instance.BOD:
-        for u in range(instance.number_of_users):
-            model.Add(user_assignment[s2][u] == 1).OnlyEnforceIf(user_assignment[s1][u])
-
-    # At-most-k
-    for (k, stp) in instance.at_most_k:
-        user_flag = [model.NewBoolVar(f'atmostk_u{u}') for u in range(instance.number_of_users)]
-        for u in range(instance.number_of_users):
-            # if user is assigned in any of stp => user_flag[u] = 1
-            for ss in stp:
-                model.Add(user_flag[u] == 1).OnlyEnforceIf(user_assignment[ss][u])
-            # user assigned to stp >= user_flag[u]
-            model.Add(sum(user_assignment[ss][u] for ss in stp) >= user_flag[u])
-        model.Add(sum(user_flag) <= k)
-
-    # One-team
-    for (steps_, teams) in instance.one_team:
-        team_flags = [model.NewBoolVar(f'team_{i}') for i in range(len(teams))]
-        model.AddExactlyOne(team_flags)
-        # if team i is selected => users outside that team for the steps => 0
-        for i, tlist in enumerate(teams):
-            # if not in tlist => can't assign
+    with verbose_logging(logger, verbose):
+        instance = parse_file(filename)
+        logger.debug("File: %s", filename)
+        logger.debug("Steps: %s, Users: %s, Constraints: %s",
+                     instance.number_of_steps, instance.number_of_users, instance.number_of_constraints)
+        logger.debug("Auth: %s", instance.auth)
+        logger.debug("SOD: %s", instance.SOD)
+        logger.debug("BOD: %s", instance.BOD)
+        logger.debug("At-most-k: %s", instance.at_most_k)
+        logger.debug("One-team: %s", instance.one_team)
+        logger.debug("User-capacity: %s", instance.user_capacity)
+
+        start_ns = perf_counter_ns()
+
+        model = cp_model.CpModel()
+
+        # Auth => invert to the set of users allowed on each step.
+        # auth[u] == [] means unrestricted, [-1] means no step at all.
+        all_users = range(instance.number_of_users)
+        all_steps = frozenset(range(instance.number_of_steps))
+        auth_sets = [frozenset(stp_list) - {-1} if stp_list else all_steps
+                     for stp_list in instance.auth]
+        allowed_users_at_step = [[] for _ in range(instance.number_of_steps)]
+        for u, allowed in enumerate(auth_sets):
+            for s in sorted(allowed):
+                allowed_users_at_step[s].append(u)
+        allowed_set_at_step = [frozenset(users) for users in allowed_users_at_step]
+
+        # user_assignment[(s, u)] = bool => step s is assigned to user u.
+        # Only authorised (s, u) pairs get a variable; a missing key is a fixed 0.
+        user_assignment = {}
+        for s in range(instance.number_of_steps):
+            for u in allowed_users_at_step[s]:
+                user_assignment[(s, u)] = model.NewBoolVar(f's{s+1}_u{u+1}')
+        # each step exactly 1 user
+        for s in range(instance.number_of_steps):
+            model.AddExactlyOne(user_assignment[(s, u)] for u in allowed_users_at_step[s])
+
+        # assigned_user[s] = 1-based id of the user on step s, restricted to the
+        # authorised users. The integer view carries BOD and One-team; the Booleans
+        # above are kept for SOD and the counting constraints and channelled in.
+        assigned_user = []
+        for s in range(instance.number_of_steps):
+            if allowed_users_at_step[s]:
+                domain = cp_model.Domain.FromValues([u + 1 for u in allowed_users_at_step[s]])
+            else:
+                # nobody can do s; AddExactlyOne([]) already makes this infeasible
+                domain = cp_model.Domain(1, instance.number_of_users)
+            assigned_user.append(model.NewIntVarFromDomain(domain, f's{s+1}_user'))
+        for s in range(instance.number_of_steps):
+            model.Add(assigned_user[s] == sum((u + 1) * user_assignment[(s, u)]
+                                              for u in allowed_users_at_step[s]))
+
+        # SOD => never both steps on the same user (plain clause, no reification)
+        # Only users authorised on both steps can clash.
+        for (s1, s2) in instance.SOD:
+            for u in allowed_set_at_step[s1] & allowed_set_at_step[s2]:
+                model.AddBoolOr([user_assignment[(s1, u)].Not(), user_assignment[(s2, u)].Not()])
+
+        # BOD => same user (the domains already rule out users missing from either step)
+        for (s1, s2) in instance.BOD:
+            model.Add(assigned_user[s1] == assigned_user[s2])
+
+        # At-most-k
+        # used_flags[(u, steps)] <=> user u takes one of the steps; shared by every
+        # At-most-k over the same step set (all steps => one user_used flag per user)
+        used_flags = {}
+        for (k, stp) in instance.at_most_k:
+            stp_key = frozenset(stp)
+            # users authorised on at least one of the steps; if there are no more
+            # than k of them (or no more than k steps) the bound can never bind
+            eligible = sorted(set().union(*(allowed_set_at_step[ss] for ss in stp_key)))
+            if len(eligible) <= k or len(stp_key) <= k:
+                continue
+            user_flag = []
+            for u in eligible:
+                key = (u, stp_key)
+                if key not in used_flags:
+                    xs = [user_assignment[(ss, u)] for ss in sorted(stp_key) if (ss, u) in user_assignment]
+                    flag = model.NewBoolVar(f'used_u{u+1}' if stp_key == all_steps else f'atmostk_u{u+1}')
+                    # if user is assigned in any of stp => flag = 1
+                    for x in xs:
+                        model.AddImplication(x, flag)
+                    # flag => user assigned to one of stp
+                    model.AddBoolOr(xs + [flag.Not()])
+                    used_flags[key] = flag
+                user_flag.append(used_flags[key])
+            model.Add(sum(user_flag) <= k)
+
+        # One-team
+        for (steps_, teams) in instance.one_team:
+            team_flags = [model.NewBoolVar(f'team_{i}') for i in range(len(teams))]
+            model.AddExactlyOne(team_flags)
+            # users in no team can never take these steps, whichever team is picked
+            users_in_teams = set().union(*teams)
             for s_ in steps_:
-                for u_ in range(instance.number_of_users):
-                    if u_ not in tlist:
-                        model.Add(user_assignment[s_][u_] == 0).OnlyEnforceIf(team_flags[i])
-
-    # user-capacity
-    for (u, cap) in instance.user_capacity:
-        model.Add(sum(user_assignment[s][u] for s in range(instance.number_of_steps)) <= cap)
-
-    solver = cp_model.CpSolver()
-
-    if max_solutions <= 1:
-        # single solution
-        status = solver.Solve(model)
-        end_time = currenttime() * 1000.0
-        d = dict(sat='unsat', sol=[], mul_sol='', exe_time=f'{(end_time - start_time):.2f}ms')
-        if status == cp_model.FEASIBLE or status == cp_model.OPTIMAL:
-            d['sat'] = 'sat'
-            # build sol
+                for u_ in allowed_users_at_step[s_]:
+                    if u_ not in users_in_teams:
+                        model.AddBoolOr([user_assignment[(s_, u_)].Not()])
+            # if team i is selected => every step in steps_ goes to a member of team i
+            for i, tlist in enumerate(teams):
+                team_domain = cp_model.Domain.FromValues([u_ + 1 for u_ in tlist])
+                for s_ in steps_:
+                    model.AddLinearExpressionInDomain(assigned_user[s_], team_domain).OnlyEnforceIf(team_flags[i])
+
+        # user-capacity
+        for (u, cap) in instance.user_capacity:
+            model.Add(sum(user_assignment[(s, u)] for s in range(instance.number_of_steps)
+                          if (s, u) in user_assignment) <= cap)
+
+        # Symmetry breaking: users with the same allowed steps, capacity and team
+        # memberships are interchangeable, so require them to be used in id order.
+        # Only for single-solution search, as it removes symmetric solutions.
+        if max_solutions <= 1:
+            caps = defaultdict(list)
+            for (u, cap) in instance.user_capacity:
+                caps[u].append(cap)
+            memberships = defaultdict(set)
+            for ci, (_, teams) in enumerate(instance.one_team):
+                for ti, tlist in enumerate(teams):
+                    for u in tlist:
+                        memberships[u].add((ci, ti))
+            user_steps = defaultdict(list)
             for s in range(instance.number_of_steps):
-                for u in range(instance.number_of_users):
-                    if solver.Value(user_assignment[s][u]):
-                        d['sol'].append(f's{s+1}: u{u+1}')
-            if status == cp_model.FEASIBLE:
-                d['mul_sol'] = "Multiple solutions may exist"
-            else:
-                d['mul_sol'] = "Unique solution found"
-        return d
-    else:
-        # multiple solutions
-        solutions_found = []
-
-        class MultiSolutionCallback(cp_model.CpSolverSolutionCallback):
-            def __init__(self, assign_bools, step_count, user_count, limit):
-                cp_model.CpSolverSolutionCallback.__init__(self)
-                self._assign = assign_bools
-                self._steps = step_count
-                self._users = user_count
-                self._limit = limit
-                self._count = 0
-
-            def on_solution_callback(self):
-                if self._count >= self._limit:
-                    self.StopSearch()
-                    return
-                self._count += 1
-                one_sol = []
-                for s_ in range(self._steps):
-                    for u_ in range(self._users):
-                        if self.Value(self._assign[s_][u_]):
-                            one_sol.append(f's{s_+1}: u{u_+1}')
-                solutions_found.append(one_sol)
-
-        cb = MultiSolutionCallback(user_assignment, instance.number_of_steps, instance.number_of_users, max_solutions)
-        status = solver.SearchForAllSolutions(model, cb)
-        end_time = currenttime() * 1000.0
-        d = dict(sat='unsat', sol=[], mul_sol='', exe_time=f'{(end_time - start_time):.2f}ms')
-        if len(solutions_found) > 0:
-            d['sat'] = 'sat'
-            # first solution in 'sol'
-            d['sol'] = solutions_found[0]
-            # store all solutions in mul_sol
-            blocks = []
-            for idx, sol in enumerate(solutions_found, start=1):
-                blocks.append(f"Solution {idx}:\n" + "\n".join(sol))
-            d['mul_sol'] = "\n\n".join(blocks)
-        return d
+                for u in allowed_users_at_step[s]:
+                    user_steps[u].append(s)
+            groups = defaultdict(list)
+            for u in all_users:
+                if user_steps[u]:
+                    groups[(tuple(user_steps[u]), tuple(sorted(caps[u])), frozenset(memberships[u]))].append(u)
+            for (steps_, _, _), group in groups.items():
+                # for consecutive a < b: b may take step s only if a took an earlier step
+                for u_a, u_b in zip(group, group[1:]):
+                    seen_a = None
+                    for s in steps_:
+                        x_a = user_assignment[(s, u_a)]
+                        x_b = user_assignment[(s, u_b)]
+                        if seen_a is None:
+                            model.AddBoolOr([x_b.Not()])
+                        else:
+                            model.AddImplication(x_b, seen_a)
+                        nxt = model.NewBoolVar(f'seen_u{u_a+1}_s{s+1}')
+                        model.AddImplication(x_a, nxt)
+                        if seen_a is None:
+                            model.AddImplication(nxt, x_a)
+                        else:
+                            model.AddImplication(seen_a, nxt)
+                            model.AddBoolOr([nxt.Not(), x_a, seen_a])
+                        seen_a = nxt
+
+        solver = cp_model.CpSolver()
+        apply_time_limit(solver, time_limit, deterministic)
+
+        if max_solutions <= 1:
+            # single solution, portfolio search across workers
+            solver.parameters.stop_after_first_solution = True
+            solver.parameters.num_search_workers = workers or os.cpu_count() or 8
+            status = solver.Solve(model)
+            elapsed_ms = (perf_counter_ns() - start_ns) / 1e6
+            d = dict(sat='unsat', sol=[], mul_sol='', exe_time=f'{elapsed_ms:.2f}ms')
+            if status == cp_model.FEASIBLE or status == cp_model.OPTIMAL:
+                d['sat'] = 'sat'
+                # build sol, one Value() per step from the integer view
+                d['sol'] = [f's{s+1}: u{solver.Value(var)}' for s, var in enumerate(assigned_user)]
+                if status == cp_model.FEASIBLE:
+                    d['mul_sol'] = "Multiple solutions may exist"
+                else:
+                    d['mul_sol'] = "Unique solution found"
+            elif status != cp_model.INFEASIBLE:
+                d['sat'] = 'unknown'
+            return d
+        else:
+            # multiple solutions
+            solutions_found = []
+
+            class MultiSolutionCallback(cp_model.CpSolverSolutionCallback):
+                def __init__(self, step_vars, limit):
+                    cp_model.CpSolverSolutionCallback.__init__(self)
+                    self._vars = step_vars
+                    self._limit = limit
+                    self._count = 0
+
+                def on_solution_callback(self):
+                    self._count += 1
+                    # keep raw user ids; formatting happens after the search
+                    solutions_found.append([self.Value(var) for var in self._vars])
+                    if self._count >= self._limit:
+                        self.StopSearch()
+
+            cb = MultiSolutionCallback(assigned_user, max_solutions)
+            # solution enumeration is single-worker only
+            solver.parameters.enumerate_all_solutions = True
+            solver.parameters.num_search_workers = 1
+            status = solver.Solve(model, cb)
+            elapsed_ms = (perf_counter_ns() - start_ns) / 1e6
+            d = dict(sat='unsat', sol=[], mul_sol='', exe_time=f'{elapsed_ms:.2f}ms')
+            solutions_found = [[f's{s_+1}: u{u_}' for s_, u_ in enumerate(sol)] for sol in solutions_found]
+            if len(solutions_found) > 0:
+                d['sat'] = 'sat'
+                # first solution in 'sol'
+                d['sol'] = solutions_found[0]
+                # store all solutions in mul_sol
+                blocks = []
+                for idx, sol in enumerate(solutions_found, start=1):
+                    blocks.append(f"Solution {idx}:\n" + "\n".join(sol))
+                d['mul_sol'] = "\n\n".join(blocks)
+            elif status != cp_model.INFEASIBLE:
+                d['sat'] = 'unknown'
+            return d
 
 if __name__=='__main__':
     base_path = os.path.dirname(__file__)
@@ -1,7 +1,17 @@
+import logging
 import os
 import re
-from time import time as currenttime
+from time import perf_counter_ns
 from ortools.sat.python import cp_model
+from helper import apply_time_limit, verbose_logging
+
+logger = logging.getLogger(__name__)
+
+# One-team line patterns, compiled once at import
+_STEP_RE = re.compile(r's(\d+)')
+_TEAM_RE = re.compile(r'\(([^)]+)\)')
+_USER_RE = re.compile(r'u(\d+)')
+
 
 def parse_file(filename):
     with open(filename, 'r') as file:
@@ -15,6 +25,9 @@ def parse_file(filename):
     user_capacity_constraints = []
     for line in lines[3:]:
         line = line.strip()
+        if not line or line.startswith('#'):
+            # blank or comment line
+            continue
         if line.startswith("User-capacity"):
             parts = line.split()
             user = int(parts[1][1:])
@@ -25,157 +38,185 @@ def parse_file(filename):
     return steps_count, users_count, constraints, user_capacity_constraints
 
 
-def Solver(filename, max_solutions=1, **kwargs):
+def Solver(filename, max_solutions=1, verbose=False, time_limit=None, deterministic=False, workers=None,
+           **kwargs):
     """
     :param filename: Path to the input file
     :param max_solutions: # of solutions requested; default 1 => single solution
+    :param verbose: log diagnostics to stdout (module logger at DEBUG)
+    :param time_limit: optional search limit in seconds; None => unlimited. A search stopped
+        before any solution or proof of infeasibility reports sat='unknown'
+    :param deterministic: treat time_limit as deterministic time rather than wall-clock
+    :param workers: CP-SAT workers for single-solution search; None => one per CPU
     """
-    model = cp_model.CpModel()
-    steps_count, users_count, constraints, user_capacity_constraints = parse_file(filename)
-
-    assignments = [model.NewIntVar(1, users_count, f'step_{i+1}') for i in range(steps_count)]
-    user_authorisations = {}
-    one_team_constraints = []
-
-    # ---------- parse constraints ----------
-    for c in constraints:
-        parts = c.split()
-        if parts[0] == "Authorisations":
-            u = int(parts[1][1:])
-            allowed = [int(x[1:]) for x in parts[2:]]
-            if u in user_authorisations:
-                print("Duplicate authorisations, ignoring extras.")
+    with verbose_logging(logger, verbose):
+        model = cp_model.CpModel()
+        steps_count, users_count, constraints, user_capacity_constraints = parse_file(filename)
+
+        assignments = [model.NewIntVar(1, users_count, f'step_{i+1}') for i in range(steps_count)]
+        user_authorisations = {}
+        one_team_constraints = []
+
+        # ---------- parse constraints ----------
+        for c in constraints:
+            parts = c.split()
+            if parts[0] == "Authorisations":
+                u = int(parts[1][1:])
+                allowed = [int(x[1:]) for x in parts[2:]]
+                if u in user_authorisations:
+                    logger.warning("Duplicate authorisations for u%s, ignoring extras.", u)
+                    continue
+                # bit s set <=> u may perform step s (1-based)
+                auth_mask = 0
+                for st in allowed:
+                    auth_mask |= 1 << st
+                user_authorisations[u] = auth_mask
+                for step in range(steps_count):
+                    if not (auth_mask >> (step + 1)) & 1:
+                        model.Add(assignments[step] != u)
+
+            elif parts[0] == "Separation-of-duty":
+                s1, s2 = int(parts[1][1:]), int(parts[2][1:])
+                model.Add(assignments[s1 - 1] != assignments[s2 - 1])
+
+            elif parts[0] == "Binding-of-duty":
+                s1, s2 = int(parts[1][1:]), int(parts[2][1:])
+                model.Add(assignments[s1 - 1] == assignments[s2 - 1])
+
+            elif parts[0] == "At-most-k":
+                k = int(parts[1])
+                step_indices = [int(s[1:]) - 1 for s in parts[2:]]
+                user_vars = [model.NewIntVar(1, users_count, f'user_{x}') for x in range(k)]
+                for i in range(k - 1):
+                    model.Add(user_vars[i] < user_vars[i+1])
+                for st in step_indices:
+                    bools_ = []
+                    for i in range(k):
+                        b = model.NewBoolVar(f'step_{st}_assigned_{i}')
+                        model.Add(assignments[st] == user_vars[i]).OnlyEnforceIf(b)
+                        bools_.append(b)
+                    model.AddExactlyOne(bools_)
+
+            elif parts[0] == "One-team":
+                line = c
+                st = _STEP_RE.findall(line)
+                group_steps = [int(x) for x in st]
+                teams_raw = _TEAM_RE.findall(line)
+                teams = []
+                for tstr in teams_raw:
+                    us = _USER_RE.findall(tstr)
+                    teams.append([int(uu) for uu in us])
+                if not group_steps or not teams:
+                    logger.warning("Unable to parse One-team: %s", line)
+                    continue
+                one_team_constraints.append({'steps': group_steps, 'teams': teams})
+
+        # ---------- process One-team constraints ----------
+        seen_one_team = set()
+        for idx, otc in enumerate(one_team_constraints):
+            stp = otc['steps']
+            # repeated teams would only add interchangeable selectors
+            tms = list(dict.fromkeys(frozenset(team) for team in otc['teams']))
+            key = (frozenset(stp), frozenset(tms))
+            if key in seen_one_team:
                 continue
-            user_authorisations[u] = allowed
-            for step in range(steps_count):
-                if (step + 1) not in allowed:
-                    model.Add(assignments[step] != u)
-
-        elif parts[0] == "Separation-of-duty":
-            s1, s2 = int(parts[1][1:]), int(parts[2][1:])
-            model.Add(assignments[s1 - 1] != assignments[s2 - 1])
-
-        elif parts[0] == "Binding-of-duty":
-            s1, s2 = int(parts[1][1:]), int(parts[2][1:])
-            model.Add(assignments[s1 - 1] == assignments[s2 - 1])
-
-        elif parts[0] == "At-most-k":
-            k = int(parts[1])
-            step_indices = [int(s[1:]) - 1 for s in parts[2:]]
-            user_vars = [model.NewIntVar(1, users_count, f'user_{x}') for x in range(k)]
-            for i in range(k - 1):
-                model.Add(user_vars[i] < user_vars[i+1])
-            for st in step_indices:
-                bools_ = []
-                for i in range(k):
-                    b = model.NewBoolVar(f'step_{st}_assigned_{i}')
-                    model.Add(assignments[st] == user_vars[i]).OnlyEnforceIf(b)
-                    bools_.append(b)
-                model.AddExactlyOne(bools_)
-
-        elif parts[0] == "One-team":
-            line = c
-            st = re.findall(r's(\d+)', line)
-            group_steps = [int(x) for x in st]
-            teams_raw = re.findall(r'\(([^)]+)\)', line)
-            teams = []
-            for tstr in teams_raw:
-                us = re.findall(r'u(\d+)', tstr)
-                teams.append([int(uu) for uu in us])
-            if not group_steps or not teams:
-                print(f"Warning parse One-team: {line}")
+            seen_one_team.add(key)
+            step_vars = [assignments[s - 1] for s in stp]
+            if len(tms) == 1:
+                # a single team needs no selector: restrict the domains directly
+                team_domain = cp_model.Domain.FromValues(sorted(tms[0]))
+                for var in step_vars:
+                    model.AddLinearExpressionInDomain(var, team_domain)
                 continue
-            one_team_constraints.append({'steps': group_steps, 'teams': teams})
-
-    # ---------- process One-team constraints ----------
-    for idx, otc in enumerate(one_team_constraints):
-        stp = otc['steps']
-        tms = otc['teams']
-        step_vars = [assignments[s - 1] for s in stp]
-        allowed = []
-        import itertools
-        for team in tms:
-            for combo in itertools.product(team, repeat=len(stp)):
-                allowed.append(combo)
-        model.AddAllowedAssignments(step_vars, allowed)
-
-    # ---------- user capacity ----------
-    for (u, cap) in user_capacity_constraints:
-        bools = []
-        for s in range(steps_count):
-            b = model.NewBoolVar(f'u{u}_s{s+1}')
-            model.Add(assignments[s] == u).OnlyEnforceIf(b)
-            model.Add(assignments[s] != u).OnlyEnforceIf(b.Not())
-            bools.append(b)
-        model.Add(sum(bools) <= cap)
-
-    # ---------- handle unknown user authorisations (all steps are allowed) ----------
-    for uu in range(1, users_count+1):
-        if uu not in user_authorisations:
-            print(f"User u{uu} => no explicit authorisations => can do any step")
-
-    solver = cp_model.CpSolver()
-    t0 = currenttime() * 1000
-
-    if max_solutions <= 1:
-        status = solver.Solve(model)
-        t1 = currenttime() * 1000
-        d = {
-            'sat': 'unsat',
-            'sol': [],
-            'mul_sol': '',
-            'exe_time': f"{int(t1 - t0)}ms"
-        }
-        if status in (cp_model.FEASIBLE, cp_model.OPTIMAL):
-            d['sat'] = 'sat'
-            arr = []
-            for i in range(steps_count):
-                arr.append(f"s{i+1}: u{solver.Value(assignments[i])}")
-            d['sol'] = arr
-        print("Solver status:", solver.StatusName(status))
-        return d
-    else:
-        # MULTIPLE solutions
-        all_solutions = []
-        class MultipleSolCollector(cp_model.CpSolverSolutionCallback):
-            def __init__(self, varlist, limit):
-                cp_model.CpSolverSolutionCallback.__init__(self)
-                self._vars = varlist
-                self._limit = limit
-                self._found = 0
-
-            def on_solution_callback(self):
-                if self._found >= self._limit:
-                    self.StopSearch()
-                    return
-                self._found += 1
-                sol = []
-                for i, var in enumerate(self._vars):
-                    val = self.Value(var)
-                    sol.append(f"s{i+1}: u{val}")
-                all_solutions.append(sol)
-
-        collector = MultipleSolCollector(assignments, max_solutions)
-        status = solver.SearchForAllSolutions(model, collector)
-        t1 = currenttime() * 1000
-        d = {
-            'sat': 'unsat',
-            'sol': [],
-            'mul_sol': '',
-            'exe_time': f"{int(t1 - t0)}ms"
-        }
-        if len(all_solutions) > 0:
-            d['sat'] = 'sat'
-            d['sol'] = all_solutions[0]
-            # store all in mul_sol
-            blocks = []
-            for idx, sol in enumerate(all_solutions, start=1):
-                block = f"Solution {idx}:\n" + "\n".join(sol)
-                blocks.append(block)
-            d['mul_sol'] = "\n\n".join(blocks)
-
-        print("Solver status:", solver.StatusName(status))
-        return d
+            # one selector per team instead of enumerating team^|steps| tuples:
+            # the chosen team restricts every step's domain to its members
+            team_vars = [model.NewBoolVar(f'oneteam_{idx}_team_{t}') for t in range(len(tms))]
+            model.AddExactlyOne(team_vars)
+            for team, team_var in zip(tms, team_vars):
+                team_domain = cp_model.Domain.FromValues(sorted(team))
+                for var in step_vars:
+                    model.AddLinearExpressionInDomain(var, team_domain).OnlyEnforceIf(team_var)
+
+        # ---------- user capacity ----------
+        for (u, cap) in user_capacity_constraints:
+            bools = []
+            for s in range(steps_count):
+                b = model.NewBoolVar(f'u{u}_s{s+1}')
+                model.Add(assignments[s] == u).OnlyEnforceIf(b)
+                model.Add(assignments[s] != u).OnlyEnforceIf(b.Not())
+                bools.append(b)
+            model.Add(sum(bools) <= cap)
+
+        solver = cp_model.CpSolver()
+        apply_time_limit(solver, time_limit, deterministic)
+        t0 = perf_counter_ns()
+
+        if max_solutions <= 1:
+            # pure feasibility: nothing to gain after the first solution,
+            # so let the portfolio race across workers
+            solver.parameters.stop_after_first_solution = True
+            solver.parameters.num_search_workers = workers or os.cpu_count() or 8
+            status = solver.Solve(model)
+            elapsed_ms = (perf_counter_ns() - t0) // 1_000_000
+            d = {
+                'sat': 'unsat',
+                'sol': [],
+                'mul_sol': '',
+                'exe_time': f"{elapsed_ms}ms"
+            }
+            if status in (cp_model.FEASIBLE, cp_model.OPTIMAL):
+                d['sat'] = 'sat'
+                arr = []
+                for i in range(steps_count):
+                    arr.append(f"s{i+1}: u{solver.Value(assignments[i])}")
+                d['sol'] = arr
+            elif status != cp_model.INFEASIBLE:
+                d['sat'] = 'unknown'
+            logger.debug("Solver status: %s", solver.StatusName(status))
+            return d
+        else:
+            # MULTIPLE solutions
+            all_solutions = []
+            class MultipleSolCollector(cp_model.CpSolverSolutionCallback):
+                def __init__(self, varlist, limit):
+                    cp_model.CpSolverSolutionCallback.__init__(self)
+                    self._vars = varlist
+                    self._limit = limit
+                    self._found = 0
+
+                def on_solution_callback(self):
+                    self._found += 1
+                    # raw user ids only; strings are built after the search
+                    all_solutions.append([self.Value(var) for var in self._vars])
+                    if self._found >= self._limit:
+                        self.StopSearch()
+
+            collector = MultipleSolCollector(assignments, max_solutions)
+            solver.parameters.enumerate_all_solutions = True
+            solver.parameters.num_search_workers = 1
+            status = solver.Solve(model, collector)
+            elapsed_ms = (perf_counter_ns() - t0) // 1_000_000
+            d = {
+                'sat': 'unsat',
+                'sol': [],
+                'mul_sol': '',
+                'exe_time': f"{elapsed_ms}ms"
+            }
+            all_solutions = [[f"s{i+1}: u{val}" for i, val in enumerate(sol)] for sol in all_solutions]
+            if len(all_solutions) > 0:
+                d['sat'] = 'sat'
+                d['sol'] = all_solutions[0]
+                # store all in mul_sol
+                blocks = []
+                for idx, sol in enumerate(all_solutions, start=1):
+                    block = f"Solution {idx}:\n" + "\n".join(sol)
+                    blocks.append(block)
+                d['mul_sol'] = "\n\n".join(blocks)
+            elif status != cp_model.INFEASIBLE:
+                d['sat'] = 'unknown'
+
+            logger.debug("Solver status: %s", solver.StatusName(status))
+            return d
 
 if __name__ == '__main__':
     base = os.path.dirname(__file__)
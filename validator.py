@@ -2,30 +2,92 @@ import re
 import itertools
 import sys
 
+import numpy as np
+
+# "s<step>: u<user>" solution lines, matched over the raw file bytes
+_ASSIGNMENT_RE = re.compile(rb's(\d+):\s*u(\d+)')
+
+def _parse_one_team(line, parts):
+    """Steps and teams of a One-team line, e.g. "One-team s1 s2 (u1 u2) (u3)"."""
+    steps = [int(tok[1:]) for tok in parts if tok[:1] == 's' and tok[1:].isdigit()]
+    # linear scan over the "(...)" groups instead of a regex
+    teams = []
+    i = 0
+    while (lp := line.find('(', i)) != -1:
+        rp = line.find(')', lp)
+        if rp == -1:
+            break
+        members = line[lp + 1:rp].split()
+        if members:
+            teams.append([int(u[1:]) for u in members])
+        i = rp + 1
+    return steps, teams
+
+
+def _user_mask(users):
+    """Bitmask with bit u set for every user u."""
+    mask = 0
+    for u in users:
+        mask |= 1 << u
+    return mask
+
+
 def parse_file(filename):
     """
     Parse the input file to extract steps, users, constraints, and user capacity constraints.
+    Constraints are returned already typed, keyed by kind:
+    auth [(user, steps)], amk [(k, steps)], one_team [(steps, teams, team_masks)], and sod/bod as
+    (s1s, s2s) pairs of int32 step columns. auth_by_user maps each user to the
+    (index into auth, allowed-step bitmask) of its Authorisations lines.
     """
-    with open(filename, 'r') as file:
-        lines = file.readlines()
+    # one buffered read, split in memory
+    with open(filename, 'rb', buffering=1 << 20) as file:
+        lines = file.read().decode().splitlines()
     
     # Parse #Steps, #Users, #Constraints
     steps_count = int(lines[0].split(': ')[1])
     users_count = int(lines[1].split(': ')[1])
     constraints_count = int(lines[2].split(': ')[1])
 
-    constraints = []
+    constraints = {"auth": [], "auth_by_user": {}, "amk": [], "one_team": []}
+    sod_pairs, bod_pairs = [], []
     user_capacity_constraints = {}
 
     for line in lines[3:]:
         line = line.strip()
-        if line.startswith("User-capacity"):
-            parts = line.split()
+        parts = line.split()
+        if not parts:
+            continue
+        kind = parts[0]
+        if kind == "Authorisations":
+            user = int(parts[1][1:])
+            allowed_steps = frozenset(int(step[1:]) for step in parts[2:])
+            # bit s set <=> step s allowed
+            mask = 0
+            for step in allowed_steps:
+                mask |= 1 << step
+            constraints["auth_by_user"].setdefault(user, []).append((len(constraints["auth"]), mask))
+            constraints["auth"].append((user, allowed_steps))
+        elif kind == "Separation-of-duty":
+            sod_pairs.append((int(parts[1][1:]), int(parts[2][1:])))
+        elif kind == "Binding-of-duty":
+            bod_pairs.append((int(parts[1][1:]), int(parts[2][1:])))
+        elif kind == "At-most-k":
+            constraints["amk"].append((int(parts[1]), [int(s[1:]) for s in parts[2:]]))
+        elif kind == "One-team":
+            # Extract step indices and team definitions from the constraint
+            steps, teams = _parse_one_team(line, parts)
+            team_masks = [_user_mask(team) for team in teams]
+            constraints["one_team"].append((steps, teams, team_masks))
+        elif kind == "User-capacity":
             user_id = int(parts[1][1:])  # e.g., u1
             capacity = int(parts[2])
             user_capacity_constraints[user_id] = capacity
-        else:
-            constraints.append(line)
+
+    # Pair constraints as two step columns so checks compare whole columns at once
+    for kind, pairs in (("sod", sod_pairs), ("bod", bod_pairs)):
+        constraints[kind] = (np.fromiter((s1 for s1, _ in pairs), dtype=np.int32, count=len(pairs)),
+                             np.fromiter((s2 for _, s2 in pairs), dtype=np.int32, count=len(pairs)))
 
     return steps_count, users_count, constraints, user_capacity_constraints
 
@@ -37,15 +99,16 @@ def parse_solution_file(solution_file):
     s1: u372
     s2: u268
     """
-    step_to_user = {}
-    with open(solution_file, 'r') as file:
-        lines = file.readlines()
-        for line in lines:
-            step, user = line.strip().split(': ')
-            step_num = int(step[1:])  # Extract step number (e.g., s1 -> 1)
-            user_num = int(user[1:])  # Extract user number (e.g., u372 -> 372)
-            step_to_user[step_num] = user_num
-    return step_to_user
+    with open(solution_file, 'rb') as file:
+        pairs = _ASSIGNMENT_RE.findall(file.read())
+    if not pairs:
+        return {}
+    # one regex pass, then a single bytes -> int conversion in NumPy
+    try:
+        nums = np.array(pairs).astype(np.int64)
+    except OverflowError:  # ids past int64; keep them as Python ints
+        return {int(step): int(user) for step, user in pairs}
+    return dict(zip(nums[:, 0].tolist(), nums[:, 1].tolist()))
 
 
 def validate_solution_from_solver(filename, solution_file):
@@ -55,77 +118,100 @@ def validate_solution_from_solver(filename, solution_file):
     steps_count, users_count, constraints, user_capacity_constraints = parse_file(filename)
     step_to_user = parse_solution_file(solution_file)
 
+    # Dense step -> user array (0 = unassigned) backing the vectorised pair checks, sized
+    # by the ids the instance refers to; larger ids in the solution never index anything
+    pair_steps = [int(col.max()) for col in constraints["sod"] + constraints["bod"] if col.size]
+    amk_steps = [max(step_indices) for _, step_indices in constraints["amk"] if step_indices]
+    step_limit = max([steps_count, *pair_steps, *amk_steps])
+    team_users = [u for _, teams, _ in constraints["one_team"] for team in teams for u in team]
+    user_limit = max([users_count, *constraints["auth_by_user"], *user_capacity_constraints, *team_users])
+    assigned = np.zeros(step_limit + 1, dtype=np.int32)
+    # users past user_limit are in no constraint but still have to compare as distinct users
+    user_codes = {}
+
+    # Single pass over the assignment: fill the array, count steps per user and
+    # find the authorisation violation of the earliest Authorisations line
+    # (then earliest step), as a per-line scan would report it
+    user_step_counts = {}
+    first_auth_violation = None
+    auth_by_user = constraints["auth_by_user"]
+    for step, user in step_to_user.items():
+        if step <= step_limit:
+            assigned[step] = user if user <= user_limit else user_codes.setdefault(user, user_limit + 1 + len(user_codes))
+        user_step_counts[user] = user_step_counts.get(user, 0) + 1
+        for idx, mask in auth_by_user.get(user, ()):
+            if not (mask >> step) & 1:
+                if first_auth_violation is None or idx < first_auth_violation[0]:
+                    first_auth_violation = (idx, step)
+                break
+
     # Validator for each constraint type
     def validate_authorisations():
-        for constraint in constraints:
-            parts = constraint.split()
-            if parts[0] == "Authorisations":
-                user = int(parts[1][1:])
-                allowed_steps = {int(step[1:]) for step in parts[2:]}
-                for step, assigned_user in step_to_user.items():
-                    if assigned_user == user and step not in allowed_steps:
-                        print(f"Authorisation violated: User u{user} assigned to step s{step} not in allowed steps {allowed_steps}.")
-                        return False
+        if first_auth_violation is not None:
+            idx, step = first_auth_violation
+            user, allowed_steps = constraints["auth"][idx]
+            # printed in set notation, as the message always has
+            steps_text = "{" + ", ".join(map(str, allowed_steps)) + "}" if allowed_steps else "set()"
+            print(f"Authorisation violated: User u{user} assigned to step s{step} not in allowed steps {steps_text}.")
+            return False
         return True
 
     def validate_separation_of_duty():
-        for constraint in constraints:
-            parts = constraint.split()
-            if parts[0] == "Separation-of-duty":
-                step1, step2 = int(parts[1][1:]), int(parts[2][1:])
-                if step_to_user.get(step1) == step_to_user.get(step2):
-                    print(f"Separation-of-duty violated: Steps s{step1} and s{step2} assigned to the same user u{step_to_user.get(step1)}.")
-                    return False
+        s1s, s2s = constraints["sod"]
+        violations = np.flatnonzero(assigned[s1s] == assigned[s2s])
+        if violations.size:
+            step1, step2 = int(s1s[violations[0]]), int(s2s[violations[0]])
+            print(f"Separation-of-duty violated: Steps s{step1} and s{step2} assigned to the same user u{step_to_user.get(step1)}.")
+            return False
         return True
 
     def validate_binding_of_duty():
-        for constraint in constraints:
-            parts = constraint.split()
-            if parts[0] == "Binding-of-duty":
-                step1, step2 = int(parts[1][1:]), int(parts[2][1:])
-                if step_to_user.get(step1) != step_to_user.get(step2):
-                    print(f"Binding-of-duty violated: Steps s{step1} and s{step2} assigned to different users u{step_to_user.get(step1)} and u{step_to_user.get(step2)}.")
-                    return False
+        s1s, s2s = constraints["bod"]
+        violations = np.flatnonzero(assigned[s1s] != assigned[s2s])
+        if violations.size:
+            step1, step2 = int(s1s[violations[0]]), int(s2s[violations[0]])
+            print(f"Binding-of-duty violated: Steps s{step1} and s{step2} assigned to different users u{step_to_user.get(step1)} and u{step_to_user.get(step2)}.")
+            return False
         return True
 
     def validate_at_most_k():
-        for constraint in constraints:
-            parts = constraint.split()
-            if parts[0] == "At-most-k":
-                k = int(parts[1])
-                step_indices = [int(s[1:]) for s in parts[2:]]
-                users_assigned = {step_to_user.get(step) for step in step_indices if step_to_user.get(step)}
-                if len(users_assigned) > k:
-                    print(f"At-most-k violated: More than {k} unique users assigned to steps {step_indices} (users: {users_assigned}).")
-                    return False
+        # count distinct users with a reusable "seen" stamp instead of a set per constraint
+        step_users = assigned.tolist()
+        seen = bytearray(max(step_users) + 1)
+        for k, step_indices in constraints["amk"]:
+            users = [step_users[step] for step in step_indices]
+            distinct = 0
+            for u in users:
+                if u and not seen[u]:
+                    seen[u] = 1
+                    distinct += 1
+            for u in users:
+                seen[u] = 0
+            if distinct > k:
+                users_assigned = {user for step in step_indices if (user := step_to_user.get(step))}
+                print(f"At-most-k violated: More than {k} unique users assigned to steps {step_indices} (users: {users_assigned}).")
+                return False
         return True
 
     def validate_one_team():
-        for constraint in constraints:
-            if constraint.startswith("One-team"):
-                parts = constraint.split()
-                # Extract step indices from the constraint
-                steps = [int(s) for s in re.findall(r's(\d+)', constraint)]
-                # Extract team definitions from the constraint
-                teams_raw = re.findall(r'\(([^)]+)\)', constraint)
-                teams = [[int(u[1:]) for u in team.split()] for team in teams_raw]
-
-                # Get the assigned users for the steps
-                assigned_users = [step_to_user.get(step) for step in steps if step_to_user.get(step)]
-
-                # Check if assigned users match any valid team
-                if not any(all(user in team for user in assigned_users) for team in teams):
-                    print(f"One-team violated: Steps {steps} assigned users {assigned_users} do not match any valid team {teams}.")
-                    return False
+        for steps, teams, team_masks in constraints["one_team"]:
+            # Get the assigned users for the steps
+            assigned_users = [user for step in steps if (user := step_to_user.get(step))]
+            # a user past user_limit is in no team; don't build a mask that wide for it
+            if max(assigned_users, default=0) > user_limit:
+                fits = False
+            else:
+                assigned_mask = _user_mask(assigned_users)
+                fits = any(assigned_mask & ~team_mask == 0 for team_mask in team_masks)
+
+            # Check if assigned users fit inside any valid team
+            if not fits:
+                print(f"One-team violated: Steps {steps} assigned users {assigned_users} do not match any valid team {teams}.")
+                return False
         return True
 
 
     def validate_user_capacity():
-        # Count the number of steps assigned to each user
-        user_step_counts = {}
-        for step, user in step_to_user.items():
-            user_step_counts[user] = user_step_counts.get(user, 0) + 1
-
         for user, capacity in user_capacity_constraints.items():
             assigned_steps = user_step_counts.get(user, 0)
             if assigned_steps > capacity:
@@ -1,141 +1,648 @@
+import functools
+import hashlib
+import itertools
+import pickle
 import re
+import stat
+import tempfile
+from array import array
 import os
 import sys
-from typing import Dict, List, Set, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+# Below this many At-most-k step references the NumPy check is faster
+# than importing Numba and loading the compiled kernel.
+JIT_MIN_AMK_STEPS = 5000
+# Likewise for the One-team kernel, counted in team members over all constraints.
+JIT_MIN_TEAM_USERS = 5000
+
+# From this many assigned steps on, the authorisation check gathers from the packed
+# user x step bit matrix instead of probing step_auth per assignment.
+AUTH_VECTOR_MIN_STEPS = 200
+
+# Up to this many SoD/BoD pairs plus At-most-k step references, a generated
+# straight-line check beats the NumPy calls' fixed overhead.
+CODEGEN_MAX_TERMS = 200
+
+# WSPValidator.load keeps at most this many parsed instances on disk, dropping the
+# least recently used ones first.
+CACHE_MAX_ENTRIES = 64
+
+# "s<step>: u<user>" solution lines, matched over the raw file bytes
+_ASSIGNMENT_RE = re.compile(rb's(\d+):\s*u(\d+)')
+# digit runs of a constraint line, i.e. its ids and bounds without the s/u prefixes
+_NUM_RE = re.compile(r'\d+')
+
+def _parse_one_team(line: str, parts: List[str]) -> Tuple[List[int], List[List[int]]]:
+    """Steps and teams of a One-team line, e.g. "One-team s1 s2 (u1 u2) (u3)"."""
+    steps = [int(tok[1:]) for tok in parts if tok[:1] == 's' and tok[1:].isdigit()]
+    # linear scan over the "(...)" groups instead of a regex
+    teams = []
+    i = 0
+    while (lp := line.find('(', i)) != -1:
+        rp = line.find(')', lp)
+        if rp == -1:
+            break
+        members = line[lp + 1:rp].split()
+        if members:
+            teams.append([int(u[1:]) for u in members])
+        i = rp + 1
+    return steps, teams
+
+
+def _private(st: os.stat_result) -> bool:
+    """True if `st` belongs to the current user and grants nobody else any access."""
+    if hasattr(os, "getuid") and st.st_uid != os.getuid():
+        return False
+    return os.name == "nt" or st.st_mode & 0o077 == 0
+
+
+def _cache_dir() -> Optional[str]:
+    """
+    Per-user directory for WSPValidator.load's pickles, or None when it cannot be trusted:
+    it must be a real directory (not a symlink) owned by and private to the current user.
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    if not os.path.isabs(base):
+        return None
+    path = os.path.join(base, "wsp-validator")
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        st = os.lstat(path)
+    except OSError:
+        return None
+    return path if stat.S_ISDIR(st.st_mode) and _private(st) else None
+
+
+def _prune_cache(cache_dir: str) -> None:
+    """Delete the least recently used entries beyond CACHE_MAX_ENTRIES."""
+    with os.scandir(cache_dir) as it:
+        entries = [e for e in it if e.name.endswith(".pkl") and e.is_file(follow_symlinks=False)]
+    if len(entries) <= CACHE_MAX_ENTRIES:
+        return
+    entries.sort(key=lambda e: e.stat(follow_symlinks=False).st_mtime_ns)
+    for entry in entries[:len(entries) - CACHE_MAX_ENTRIES]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def _user_mask(users) -> int:
+    """Bitmask with bit u set for every user u."""
+    mask = 0
+    for u in users:
+        mask |= 1 << u
+    return mask
+
+
+def _components(pairs: List[Tuple[int, int]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Union-find over the steps of `pairs`. Returns the component index of each pair and the
+    components in CSR form: component c holds steps[offsets[c]:offsets[c + 1]].
+    """
+    parent = {}
+
+    def find(s):
+        parent.setdefault(s, s)
+        while parent[s] != s:
+            parent[s] = parent[parent[s]]  # path halving
+            s = parent[s]
+        return s
+
+    for s1, s2 in pairs:
+        r1, r2 = find(s1), find(s2)
+        if r1 != r2:
+            parent[r1] = r2
+
+    index, members = {}, []
+    for s in parent:
+        r = find(s)
+        if r not in index:
+            index[r] = len(members)
+            members.append([])
+        members[index[r]].append(s)
+    pair_comp = np.fromiter((index[find(s1)] for s1, _ in pairs), dtype=np.int32, count=len(pairs))
+    offsets = np.cumsum([0] + [len(m) for m in members], dtype=np.int32)
+    steps = np.fromiter(itertools.chain.from_iterable(members), dtype=np.int32, count=int(offsets[-1]))
+    return pair_comp, offsets, steps
+
+
+def _specialised_check(sod_pairs: List[Tuple[int, int]], bod_pairs: List[Tuple[int, int]],
+                       at_most_k: List[Tuple[int, List[int]]]):
+    """
+    Compile check(a) with every SoD, BoD and At-most-k constraint unrolled. `a` is the dense
+    step -> user list (0 = unassigned); it returns the violated (sod, bod, amk) index lists.
+    """
+    lines = ["def check(a):", "    sod, bod, amk = [], [], []"]
+    lines += [f"    if a[{s1}] == a[{s2}]: sod.append({i})" for i, (s1, s2) in enumerate(sod_pairs)]
+    lines += [f"    if a[{s1}] != a[{s2}]: bod.append({i})" for i, (s1, s2) in enumerate(bod_pairs)]
+    for i, (k, steps) in enumerate(at_most_k):
+        users = "{" + ", ".join(f"a[{s}]" for s in steps) + "}" if steps else "set()"
+        lines.append(f"    if len({users} - {{0}}) > {k}: amk.append({i})")
+    lines.append("    return sod, bod, amk")
+    namespace = {}
+    exec("\n".join(lines), namespace)
+    return namespace["check"]
+
+
+def _amk_violations(assign, amk_k, amk_offsets, amk_steps, seen):
+    """
+    Flag each At-most-k whose steps use more than k distinct users.
+    Constraints are CSR-flattened: constraint i covers amk_steps[amk_offsets[i]:amk_offsets[i+1]].
+    `seen` is a zeroed uint8 stamp array indexed by user; it is left zeroed again.
+    """
+    n = amk_k.shape[0]
+    bad = np.zeros(n, dtype=np.bool_)
+    for i in range(n):
+        distinct = 0
+        for j in range(amk_offsets[i], amk_offsets[i + 1]):
+            u = assign[amk_steps[j]]
+            if u != 0 and seen[u] == 0:
+                seen[u] = 1
+                distinct += 1
+        for j in range(amk_offsets[i], amk_offsets[i + 1]):
+            seen[assign[amk_steps[j]]] = 0
+        bad[i] = distinct > amk_k[i]
+    return bad
+
+
+def _one_team_violations(assign, ot_offsets, ot_steps, ot_team_offsets, team_offsets, team_users, stamp):
+    """
+    Flag each One-team whose assigned users do not all fit inside one of its teams.
+    Constraint i covers steps ot_steps[ot_offsets[i]:ot_offsets[i+1]] and teams
+    ot_team_offsets[i] .. ot_team_offsets[i+1] - 1; team t has the members
+    team_users[team_offsets[t]:team_offsets[t+1]].
+    `stamp` is a zeroed int32 array indexed by user; team t stamps its members with t + 1.
+    """
+    n = ot_offsets.shape[0] - 1
+    bad = np.zeros(n, dtype=np.bool_)
+    for i in range(n):
+        fits = False
+        for t in range(ot_team_offsets[i], ot_team_offsets[i + 1]):
+            for j in range(team_offsets[t], team_offsets[t + 1]):
+                stamp[team_users[j]] = t + 1
+            fits = True
+            for j in range(ot_offsets[i], ot_offsets[i + 1]):
+                u = assign[ot_steps[j]]
+                if u != 0 and stamp[u] != t + 1:
+                    fits = False
+                    break
+            if fits:
+                break
+        bad[i] = not fits
+    return bad
+
+
+_kernels = {}  # kernel name -> compiled kernel, None if Numba is unavailable
+
+
+def _compiled(kernel):
+    """Numba-compiled version of kernel, or None when Numba is not installed."""
+    name = kernel.__name__
+    if name not in _kernels:
+        try:
+            from numba import njit
+        except ImportError:  # Numba is optional
+            _kernels[name] = None
+        else:
+            _kernels[name] = njit(cache=True)(kernel)
+    return _kernels[name]
+
 
 class WSPValidator:
     def __init__(self):
         self.steps_count: int = 0
         self.users_count: int = 0
         self.constraints_count: int = 0
-        self.authorisations: Dict[int, List[int]] = {}  # user -> allowed steps
+        # user -> allowed steps, packed as int32; membership goes through step_auth / auth_bits
+        self.authorisations: Dict[int, array] = {}
+        self.step_auth: Dict[int, Set[int]] = {}  # step -> users authorised for it, built by parse_problem
+        # auth_bits[u] packs (little-endian) the steps user u may perform. The last row and
+        # the last step column are sentinels for ids past the instance: an unknown user is
+        # unrestricted, an unknown step only allowed for users without Authorisations.
+        self.auth_bits = np.full((1, 1), 0xFF, dtype=np.uint8)
+        self.auth_last_step = 0
+        # largest step / user ids the instance refers to; solution ids past them are in
+        # no constraint, so _violations never sizes its arrays by them
+        self.step_limit = self.user_limit = 0
         self.separation_duties: List[Tuple[int, int]] = []
         self.binding_duties: List[Tuple[int, int]] = []
-        self.at_most_k: List[Tuple[int, List[int]]] = []  # (k, steps)
         self.one_team: List[Tuple[List[int], List[List[int]]]] = []  # (steps, teams)
+        self.one_team_masks: List[List[int]] = []  # per One-team, one user bitmask per team
         self.user_capacity_constraints: Dict[int, int] = {}  # user -> capacity
+        # SoA step columns of separation_duties / binding_duties, built by parse_problem
+        self.sod_s1 = self.sod_s2 = np.zeros(0, dtype=np.int32)
+        self.bod_s1 = self.bod_s2 = np.zeros(0, dtype=np.int32)
+        # steps linked by binding_duties, grouped into components: pair i lies in component
+        # bod_pair_comp[i], component c being bod_comp_steps[bod_comp_offsets[c]:bod_comp_offsets[c + 1]]
+        self.bod_pair_comp = self.bod_comp_steps = np.zeros(0, dtype=np.int32)
+        self.bod_comp_offsets = np.zeros(1, dtype=np.int32)
+        # At-most-k in CSR form: constraint i has bound amk_k[i] over the steps
+        # amk_steps[amk_offsets[i]:amk_offsets[i + 1]]
+        self.amk_k = np.zeros(0, dtype=np.int32)
+        self.amk_offsets = np.zeros(1, dtype=np.int32)
+        self.amk_steps = np.zeros(0, dtype=np.int32)
+        # One-team in CSR form for the compiled check: constraint i covers the steps
+        # ot_steps[ot_offsets[i]:ot_offsets[i + 1]] and the teams ot_team_offsets[i] ..
+        # ot_team_offsets[i + 1] - 1, team t being team_users[team_offsets[t]:team_offsets[t + 1]]
+        self.ot_offsets = self.ot_team_offsets = self.team_offsets = np.zeros(1, dtype=np.int32)
+        self.ot_steps = self.team_users = np.zeros(0, dtype=np.int32)
+        # user_capacity_constraints as parallel user / capacity columns
+        self.cap_users = self.cap_limits = np.zeros(0, dtype=np.int32)
+        # generated SoD/BoD/At-most-k check for small instances, see _specialise
+        self._run = None
+        # validate_solution results keyed by the assignment items, dropped on re-parse
+        self._validated = functools.lru_cache(maxsize=4096)(self._validate_items)
         
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # bound LRU wrapper and generated check are rebuilt on unpickling
+        del state["_validated"], state["_run"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._validated = functools.lru_cache(maxsize=4096)(self._validate_items)
+        self._specialise()
+
+    def _specialise(self) -> None:
+        """Generate the straight-line check when the instance is small enough to profit."""
+        terms = self.sod_s1.size + self.bod_s1.size + self.amk_steps.size
+        self._run = (_specialised_check(self.separation_duties, self.binding_duties, self.at_most_k)
+                     if terms <= CODEGEN_MAX_TERMS else None)
+
+    @classmethod
+    def load(cls, problem_file: str) -> "WSPValidator":
+        """
+        Parsed validator for `problem_file`, pickled to a private per-user cache directory so
+        later runs skip parsing. Entries are keyed by the file's path, mtime and size, and by
+        the mtime of this module so a changed validator never loads a stale layout. Only
+        entries owned by and private to the current user are ever unpickled.
+        """
+        path = os.path.abspath(problem_file)
+        cache_dir = _cache_dir()
+        if cache_dir is None:
+            validator = cls()
+            validator.parse_problem(path)
+            return validator
+
+        st = os.stat(path)
+        key = f"{path}:{st.st_mtime_ns}:{st.st_size}:{os.stat(__file__).st_mtime_ns}"
+        cache_path = os.path.join(cache_dir, hashlib.blake2b(key.encode(), digest_size=8).hexdigest() + ".pkl")
+        try:
+            fd = os.open(cache_path, os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0) | getattr(os, "O_BINARY", 0))
+            with open(fd, 'rb') as f:
+                entry = os.fstat(f.fileno())
+                validator = pickle.load(f) if stat.S_ISREG(entry.st_mode) and _private(entry) else None
+            if isinstance(validator, cls):
+                os.utime(cache_path)  # recently used, see _prune_cache
+                return validator
+        except Exception:  # missing or unreadable entry: parse again
+            pass
+
+        validator = cls()
+        validator.parse_problem(path)
+        try:
+            data = pickle.dumps(validator, protocol=pickle.HIGHEST_PROTOCOL)
+            # mkstemp creates the file 0600 under a fresh name
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+            try:
+                with open(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, cache_path)
+            except OSError:
+                os.remove(tmp_path)
+                raise
+            _prune_cache(cache_dir)
+        except (OSError, pickle.PicklingError):  # the cache is only an optimisation
+            pass
+        return validator
+
     def parse_problem(self, problem_file: str) -> None:
         """Parse the problem instance file."""
-        with open(problem_file, 'r') as f:
-            lines = f.readlines()
+        self._validated.cache_clear()
+        # one buffered read, split in memory
+        with open(problem_file, 'rb', buffering=1 << 20) as f:
+            lines = f.read().decode().splitlines()
             
         # Parse header
         self.steps_count = int(lines[0].split(': ')[1])
         self.users_count = int(lines[1].split(': ')[1])
         self.constraints_count = int(lines[2].split(': ')[1])
         
+        amk_k, amk_offsets, amk_steps = array('i'), array('i', [0]), array('i')
+        ot_offsets, ot_steps, ot_team_offsets = array('i', [0]), array('i'), array('i', [0])
+        team_offsets, team_users = array('i', [0]), array('i')
+
         # Parse constraints
         for line in lines[3:]:
             line = line.strip()
             if not line:
                 continue
                 
-            parts = line.split()
+            keyword = line.split(None, 1)[0]
             
-            if parts[0] == "Authorisations":
-                user = int(parts[1][1:])
-                steps = [int(s[1:]) for s in parts[2:]]
-                self.authorisations[user] = steps
+            if keyword == "Authorisations":
+                user, *steps = map(int, _NUM_RE.findall(line))
+                self.authorisations[user] = array('i', steps)
                 
-            elif parts[0] == "Separation-of-duty":
-                s1 = int(parts[1][1:])
-                s2 = int(parts[2][1:])
+            elif keyword == "Separation-of-duty":
+                s1, s2 = map(int, _NUM_RE.findall(line))
                 self.separation_duties.append((s1, s2))
                 
-            elif parts[0] == "Binding-of-duty":
-                s1 = int(parts[1][1:])
-                s2 = int(parts[2][1:])
+            elif keyword == "Binding-of-duty":
+                s1, s2 = map(int, _NUM_RE.findall(line))
                 self.binding_duties.append((s1, s2))
                 
-            elif parts[0] == "At-most-k":
-                k = int(parts[1])
-                steps = [int(s[1:]) for s in parts[2:]]
-                self.at_most_k.append((k, steps))
+            elif keyword == "At-most-k":
+                k, *steps = map(int, _NUM_RE.findall(line))
+                amk_k.append(k)
+                amk_steps.extend(steps)
+                amk_offsets.append(len(amk_steps))
                 
-            elif parts[0] == "One-team":
+            elif keyword == "One-team":
                 # Parse steps and teams
-                steps = [int(s) for s in re.findall(r's(\d+)', line)]
-                teams_raw = re.findall(r'\(([^)]+)\)', line)
-                teams = [[int(u[1:]) for u in team.split()] for team in teams_raw]
+                steps, teams = _parse_one_team(line, line.split())
                 self.one_team.append((steps, teams))
+                self.one_team_masks.append([_user_mask(team) for team in teams])
+                ot_steps.extend(steps)
+                ot_offsets.append(len(ot_steps))
+                for team in teams:
+                    team_users.extend(team)
+                    team_offsets.append(len(team_users))
+                ot_team_offsets.append(len(team_offsets) - 1)
 
-            elif parts[0] == "User-capacity":
-                user = int(parts[1][1:])
-                capacity = int(parts[2])
+            elif keyword == "User-capacity":
+                user, capacity = map(int, _NUM_RE.findall(line))
                 self.user_capacity_constraints[user] = capacity
+
+        # Invert the authorisations so each assignment probes a single per-step set
+        for user, steps in self.authorisations.items():
+            for step in steps:
+                self.step_auth.setdefault(step, set()).add(user)
+        last_user = max([self.users_count, *self.authorisations]) + 1
+        self.auth_last_step = max([self.steps_count, *self.step_auth]) + 1
+        allowed = np.ones((last_user + 1, self.auth_last_step + 1), dtype=bool)
+        for user, steps in self.authorisations.items():
+            allowed[user] = False
+            allowed[user, np.frombuffer(steps, dtype=np.int32)] = True
+        self.auth_bits = np.packbits(allowed, axis=1, bitorder='little')
+
+        # a repeated SoD pair, in either order, is the same constraint, so it is checked
+        # (and reported) once, in the orientation it was first given
+        unique_sod = {}
+        for s1, s2 in self.separation_duties:
+            unique_sod.setdefault((s1, s2) if s1 <= s2 else (s2, s1), (s1, s2))
+        self.separation_duties = list(unique_sod.values())
+        self.bod_pair_comp, self.bod_comp_offsets, self.bod_comp_steps = _components(self.binding_duties)
+
+        n_sod, n_bod = len(self.separation_duties), len(self.binding_duties)
+        self.sod_s1 = np.fromiter((s1 for s1, _ in self.separation_duties), dtype=np.int32, count=n_sod)
+        self.sod_s2 = np.fromiter((s2 for _, s2 in self.separation_duties), dtype=np.int32, count=n_sod)
+        self.bod_s1 = np.fromiter((s1 for s1, _ in self.binding_duties), dtype=np.int32, count=n_bod)
+        self.bod_s2 = np.fromiter((s2 for _, s2 in self.binding_duties), dtype=np.int32, count=n_bod)
+        # zero-copy int32 views over the array.array buffers
+        self.amk_k = np.frombuffer(amk_k, dtype=np.int32)
+        self.amk_offsets = np.frombuffer(amk_offsets, dtype=np.int32)
+        self.amk_steps = np.frombuffer(amk_steps, dtype=np.int32)
+        self.ot_offsets = np.frombuffer(ot_offsets, dtype=np.int32)
+        self.ot_steps = np.frombuffer(ot_steps, dtype=np.int32)
+        self.ot_team_offsets = np.frombuffer(ot_team_offsets, dtype=np.int32)
+        self.team_offsets = np.frombuffer(team_offsets, dtype=np.int32)
+        self.team_users = np.frombuffer(team_users, dtype=np.int32)
+        self.cap_users = np.fromiter(self.user_capacity_constraints, dtype=np.int32)
+        self.cap_limits = np.fromiter(self.user_capacity_constraints.values(), dtype=np.int32)
+        columns = (self.sod_s1, self.sod_s2, self.bod_s1, self.bod_s2, self.amk_steps, self.ot_steps)
+        self.step_limit = max([self.steps_count, *self.step_auth, *(int(c.max()) for c in columns if c.size)])
+        self.user_limit = max([self.users_count, *self.authorisations, *self.user_capacity_constraints,
+                               int(self.team_users.max(initial=0))])
+        self._specialise()
+
+    @property
+    def at_most_k(self) -> List[Tuple[int, List[int]]]:
+        """At-most-k constraints as (k, steps) tuples, rebuilt from the CSR arrays."""
+        offsets = self.amk_offsets.tolist()
+        steps = self.amk_steps.tolist()
+        return [(k, steps[offsets[i]:offsets[i + 1]]) for i, k in enumerate(self.amk_k.tolist())]
     
     def parse_solution(self, solution_file: str) -> Dict[int, int]:
         """Parse the solution file and return step -> user assignments."""
-        assignments = {}
-        with open(solution_file, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                step, user = line.split(': ')
-                step_num = int(step[1:])
-                user_num = int(user[1:])
-                assignments[step_num] = user_num
-        return assignments
+        with open(solution_file, 'rb') as f:
+            pairs = _ASSIGNMENT_RE.findall(f.read())
+        if not pairs:
+            return {}
+        # one regex pass, then a single bytes -> int conversion in NumPy
+        try:
+            nums = np.array(pairs).astype(np.int64)
+        except OverflowError:  # ids past int64; keep them as Python ints
+            return {int(step): int(user) for step, user in pairs}
+        return dict(zip(nums[:, 0].tolist(), nums[:, 1].tolist()))
     
-    def validate_solution(self, assignments: Dict[int, int]) -> Tuple[bool, List[str]]:
-        """Validate if the solution satisfies all constraints."""
-        errors = []
-        
+    def find_violations(self, assignments: Dict[int, int]) -> List[Tuple[str, np.ndarray]]:
+        """
+        Check the solution and return one (kind, rows) record per violated constraint kind,
+        in reporting order. Rows are int arrays: indices into the kind's constraint list, or
+        (step, user) / (user, steps) pairs for "auth" / "capacity". Nothing is formatted here.
+        """
+        return list(self._violations(assignments))
+
+    def is_valid(self, assignments: Dict[int, int]) -> bool:
+        """True if the solution satisfies all constraints; stops at the first violated kind."""
+        return next(self._violations(assignments), None) is None
+
+    def _violations(self, assignments: Dict[int, int]) -> Iterator[Tuple[str, np.ndarray]]:
+        """Lazily yield find_violations' records, checking each kind only when asked for."""
         # Check if all steps are assigned
         if len(assignments) != self.steps_count:
-            errors.append(f"Not all steps are assigned. Expected {self.steps_count}, got {len(assignments)}")
-            return False, errors
-        
+            yield "missing", np.array([len(assignments)])
+            return
+
+        steps, users = list(assignments), list(assignments.values())
+        if steps and (max(steps) > self.step_limit or max(users) > self.user_limit):
+            # Ids past the instance: such a step is in no constraint, so all of them share
+            # the index after step_limit; such a user is unrestricted and in no team, so it
+            # gets a distinct code above user_limit. Arrays stay sized by the instance.
+            codes = {}
+            steps = [min(step, self.step_limit + 1) for step in steps]
+            users = [user if user <= self.user_limit else codes.setdefault(user, self.user_limit + 1 + len(codes))
+                     for user in users]
+
         # Check authorisations
-        for step, user in assignments.items():
-            if user in self.authorisations:
-                if step not in self.authorisations[user]:
-                    errors.append(f"User u{user} is not authorized for step s{step}")
-        
+        # (users without an Authorisations line may perform any step)
+        if len(assignments) >= AUTH_VECTOR_MIN_STEPS:
+            cols = np.minimum(np.array(steps, dtype=np.int64), self.auth_last_step)
+            rows = np.minimum(np.array(users, dtype=np.int64), self.auth_bits.shape[0] - 1)
+            bad = np.flatnonzero(((self.auth_bits[rows, cols >> 3] >> (cols & 7)) & 1) == 0)
+            if bad.size:
+                items = list(assignments.items())
+                yield "auth", np.array([items[i] for i in bad.tolist()])
+        else:
+            restricted, step_auth = self.authorisations, self.step_auth
+            unauthorised = [(step, user) for step, user in assignments.items()
+                            if user in restricted and user not in step_auth.get(step, ())]
+            if unauthorised:
+                yield "auth", np.array(unauthorised)
+
+        # Dense step -> user array (0 = unassigned) for the pair checks
+        assign = np.zeros(self.step_limit + 2, dtype=np.int32)
+        assign[steps] = users
+
+        if self._run is not None:
+            # small instance: straight-line check generated by parse_problem
+            for kind, rows in zip(("sod", "bod", "amk"), self._run(assign.tolist())):
+                if rows:
+                    yield kind, np.array(rows, dtype=np.intp)
+        else:
+            yield from self._pair_violations(assign)
+
+        # One-team validation
+        kernel = _compiled(_one_team_violations) if self.team_users.size >= JIT_MIN_TEAM_USERS else None
+        if kernel is not None:
+            stamp = np.zeros(max(int(assign.max()), int(self.team_users.max(initial=0))) + 1, dtype=np.int32)
+            one_team = np.flatnonzero(kernel(assign, self.ot_offsets, self.ot_steps, self.ot_team_offsets,
+                                             self.team_offsets, self.team_users, stamp))
+        else:
+            one_team = []
+            step_users = assign.tolist()  # list indexing beats both dict and ndarray lookups
+            for i, ((steps, _), team_masks) in enumerate(zip(self.one_team, self.one_team_masks)):
+                assigned_mask = _user_mask(u for s in steps if (u := step_users[s]))
+
+                # Check if all assigned users fit inside a single valid team
+                if not any(assigned_mask & ~team_mask == 0 for team_mask in team_masks):
+                    one_team.append(i)
+            one_team = np.array(one_team, dtype=np.intp)
+        if one_team.size:
+            yield "one_team", one_team
+
+        # Check user capacity against per-user step counts
+        if self.cap_users.size:
+            counts = np.bincount(users, minlength=int(self.cap_users.max()) + 1)[self.cap_users]
+            over = np.flatnonzero(counts > self.cap_limits)
+            if over.size:
+                yield "capacity", np.column_stack((self.cap_users[over], counts[over]))
+
+    def _pair_violations(self, assign: np.ndarray) -> Iterator[Tuple[str, np.ndarray]]:
+        """SoD, BoD and At-most-k records over the dense step -> user array, vectorised."""
         # Check separation of duty
-        for s1, s2 in self.separation_duties:
-            if assignments.get(s1) == assignments.get(s2):
-                errors.append(f"Separation of duty violated for steps s{s1} and s{s2}")
-        
-        # Check binding of duty
-        for s1, s2 in self.binding_duties:
-            if assignments.get(s1) != assignments.get(s2):
-                errors.append(f"Binding of duty violated for steps s{s1} and s{s2}")
-        
+        sod = np.flatnonzero(assign[self.sod_s1] == assign[self.sod_s2])
+        if sod.size:
+            yield "sod", sod
+
+        # Check binding of duty: only pairs in a component whose steps went to
+        # more than one user can be violated
+        if self.bod_comp_steps.size:
+            users = assign[self.bod_comp_steps]
+            starts = self.bod_comp_offsets[:-1]
+            mixed = np.minimum.reduceat(users, starts) != np.maximum.reduceat(users, starts)
+            if mixed.any():
+                bod = np.flatnonzero(mixed[self.bod_pair_comp] & (assign[self.bod_s1] != assign[self.bod_s2]))
+                if bod.size:
+                    yield "bod", bod
+
         # Check at-most-k
-        for k, steps in self.at_most_k:
-            users = set(assignments.get(s) for s in steps if assignments.get(s) is not None)
-            if len(users) > k:
-                errors.append(f"At-most-{k} constraint violated for steps {steps}")
-        
-        # Validate One-Team
-        # One-team validation
-        for steps, teams in self.one_team:
-            assigned_users = [assignments[s] for s in steps if s in assignments]
+        kernel = _compiled(_amk_violations) if self.amk_steps.size >= JIT_MIN_AMK_STEPS else None
+        if kernel is not None:
+            seen = np.zeros(int(assign.max()) + 1, dtype=np.uint8)
+            amk = np.flatnonzero(kernel(assign, self.amk_k, self.amk_offsets, self.amk_steps, seen))
+        else:
+            # distinct (constraint, user) pairs via one np.unique over all constraints
+            users = assign[self.amk_steps].astype(np.int64)
+            owner = np.repeat(np.arange(self.amk_k.size), np.diff(self.amk_offsets))
+            assigned = users != 0
+            stride = int(assign.max()) + 1
+            pairs = np.unique(owner[assigned] * stride + users[assigned])
+            distinct = np.bincount(pairs // stride, minlength=self.amk_k.size)
+            amk = np.flatnonzero(distinct > self.amk_k)
+        if amk.size:
+            yield "amk", amk
 
-            # Check if all assigned users form a valid team
-            if not any(all(user in team for user in assigned_users) for team in teams):
-                errors.append(f"One-team violated: Steps {steps} assigned users {assigned_users} do not match any valid team {teams}.")
+    def error_records(self, violations: Iterable[Tuple[str, np.ndarray]]) -> Iterator[Tuple]:
+        """
+        Flatten find_violations' records into one (kind, *args) tuple per error: ("missing", count),
+        ("auth", step, user), ("capacity", user, steps) or (kind, constraint index) otherwise.
+        """
+        for kind, rows in violations:
+            if rows.ndim == 2:
+                for row in rows.tolist():
+                    yield (kind, *row)
+            else:
+                for i in rows.tolist():
+                    yield kind, i
 
+    def format_error(self, record: Tuple, assignments: Dict[int, int]) -> str:
+        """Error message for one error_records tuple."""
+        kind, *args = record
+        if kind == "missing":
+            return f"Not all steps are assigned. Expected {self.steps_count}, got {args[0]}"
+        elif kind == "auth":
+            step, user = args
+            return f"User u{user} is not authorized for step s{step}"
+        elif kind == "sod":
+            i, = args
+            return f"Separation of duty violated for steps s{self.sod_s1[i]} and s{self.sod_s2[i]}"
+        elif kind == "bod":
+            i, = args
+            return f"Binding of duty violated for steps s{self.bod_s1[i]} and s{self.bod_s2[i]}"
+        elif kind == "amk":
+            i, = args
+            k = self.amk_k[i]
+            steps = self.amk_steps[self.amk_offsets[i]:self.amk_offsets[i + 1]].tolist()
+            return f"At-most-{k} constraint violated for steps {steps}"
+        elif kind == "one_team":
+            i, = args
+            steps, teams = self.one_team[i]
+            assigned_users = [u for s in steps if (u := assignments.get(s)) is not None]
+            return f"One-team violated: Steps {steps} assigned users {assigned_users} do not match any valid team {teams}."
+        elif kind == "capacity":
+            user, assigned_steps = args
+            capacity = self.user_capacity_constraints[user]
+            return f"User capacity violated: User u{user} assigned to {assigned_steps} steps, exceeds capacity {capacity}."
+        raise ValueError(f"Unknown violation kind: {kind!r}")
 
-        # --- Added validation for user capacity ---
-        # Check user capacity
-        user_step_counts = {}
-        for step, user in assignments.items():
-            user_step_counts[user] = user_step_counts.get(user, 0) + 1
+    def format_errors(self, violations: Iterable[Tuple[str, np.ndarray]],
+                      assignments: Dict[int, int]) -> Iterator[str]:
+        """Yield the error message for each row of find_violations' records."""
+        for record in self.error_records(violations):
+            yield self.format_error(record, assignments)
 
-        for user, capacity in self.user_capacity_constraints.items():
-            assigned_steps = user_step_counts.get(user, 0)
-            if assigned_steps > capacity:
-                errors.append(f"User capacity violated: User u{user} assigned to {assigned_steps} steps, exceeds capacity {capacity}.")
-        
-        return len(errors) == 0, errors
+    def validate_solution(self, assignments: Dict[int, int],
+                          stop_on_first: bool = False) -> Tuple[bool, List[str]]:
+        """
+        Validate if the solution satisfies all constraints.
+        With stop_on_first, checking stops at the first violation and only its error is returned.
+        """
+        # item order is kept in the key since it fixes the order of the errors
+        valid, errors = self._validated(tuple(assignments.items()), stop_on_first)
+        return valid, list(errors)
 
-def main():
+    def _validate_items(self, items: Tuple[Tuple[int, int], ...],
+                        stop_on_first: bool) -> Tuple[bool, Tuple[str, ...]]:
+        assignments = dict(items)
+        errors = self.format_errors(self._violations(assignments), assignments)
+        if stop_on_first:
+            errors = itertools.islice(errors, 1)
+        errors = tuple(errors)
+        return not errors, errors
+
+def get_validator(problem_file: str) -> WSPValidator:
+    """
+    Parsed WSPValidator for `problem_file`, reused while the file is unchanged.
+    The instance is shared between callers and must not be mutated.
+    """
+    st = os.stat(problem_file)
+    return _cached_validator(os.path.abspath(problem_file), st.st_mtime_ns, st.st_size)
+
+@functools.lru_cache(maxsize=1024)
+def _cached_validator(problem_file: str, mtime_ns: int, size: int) -> WSPValidator:
+    # mtime_ns/size only key the cache so a rewritten file is parsed again
     validator = WSPValidator()
-    
+    validator.parse_problem(problem_file)
+    return validator
+
+def main():
     # --- Adjusted to accept command-line arguments ---
     if len(sys.argv) != 3:
         print("Usage: python validator2.py <problem_file> <solution_file>")
@@ -144,7 +651,7 @@ def main():
     solution_file = sys.argv[2]
     
     # Parse problem and solution
-    validator.parse_problem(problem_file)
+    validator = WSPValidator.load(problem_file)
     assignments = validator.parse_solution(solution_file)
     
     # Validate solution
@@ -3,6 +3,17 @@ from collections import defaultdict
 import os
 import sys
 
+# One-team line patterns, compiled once at import
+_STEP_RE = re.compile(r's(\d+)')
+_TEAM_RE = re.compile(r'\(([^)]+)\)')
+
+def _user_mask(users):
+    """Bitmask with bit u set for every user id u."""
+    mask = 0
+    for u in users:
+        mask |= 1 << u
+    return mask
+
 # Parsing functions
 def parse_problem_instance(filepath):
     """Parse problem instance from a text file."""
@@ -14,46 +25,65 @@ def parse_problem_instance(filepath):
     user_capacity = {}
 
     with open(filepath, 'r') as file:
-        lines = file.readlines()
+        lines = file.read().splitlines()
+
+    # One handler per constraint keyword, dispatched on the keyword's first two
+    # characters (At-most-k and Authorisations differ only in the second)
+    def parse_authorisations(line):
+        parts = line.split()
+        user = parts[1]
+        for step in parts[2:]:
+            authorizations[user].append(step)
+
+    def parse_separation_of_duty(line):
+        parts = line.split()
+        separation_of_duty.append((parts[1], parts[2]))
+
+    def parse_binding_of_duty(line):
+        parts = line.split()
+        binding_of_duty.append((parts[1], parts[2]))
+
+    def parse_at_most_k(line):
+        parts = line.split()
+        at_most_k.append((int(parts[1]), parts[2:]))
+
+    def parse_one_team(line):
+        steps = [int(s) for s in _STEP_RE.findall(line)]
+        teams_raw = _TEAM_RE.findall(line)
+        teams = [[int(u[1:]) for u in team.split()] for team in teams_raw]
+        # the largest team member bounds the mask an assignment can need
+        max_user = max((u for team in teams for u in team), default=0)
+        one_team.append((steps, teams, [_user_mask(team) for team in teams], max_user))
+
+    def parse_user_capacity(line):
+        parts = line.split()
+        user_capacity[parts[1]] = int(parts[2])
+
+    dispatch = {
+        'Au': parse_authorisations,
+        'Se': parse_separation_of_duty,
+        'Bi': parse_binding_of_duty,
+        'At': parse_at_most_k,
+        'On': parse_one_team,
+        'Us': parse_user_capacity,
+    }
 
     for line in lines[3:]:  # Skip header lines
         line = line.strip()
         if not line or line.startswith('#'):
             continue  # Skip empty lines and comments
-        if line.startswith('Authorisations'):
-            parts = line.split()
-            user = parts[1]
-            steps = parts[2:]
-            for step in steps:
-                authorizations[user].append(step)
-        elif line.startswith('Separation-of-duty'):
-            parts = line.split()
-            separation_of_duty.append((parts[1], parts[2]))
-        elif line.startswith('Binding-of-duty'):
-            parts = line.split()
-            binding_of_duty.append((parts[1], parts[2]))
-        elif line.startswith('At-most-k'):
-            parts = line.split()
-            k = int(parts[1])
-            steps = parts[2:]
-            at_most_k.append((k, steps))
-        elif line.startswith('One-team'):
-            steps = [int(s) for s in re.findall(r's(\d+)', line)]
-            teams_raw = re.findall(r'\(([^)]+)\)', line)
-            teams = [[int(u[1:]) for u in team.split()] for team in teams_raw]
-            one_team.append((steps, teams))
-        elif line.startswith('User-capacity'):
-            parts = line.split()
-            user = parts[1]
-            capacity = int(parts[2])
-            user_capacity[user] = capacity
+        handler = dispatch.get(line[:2])
+        if handler:
+            handler(line)
+    # Freeze each user's steps so the authorisation check is a hash probe
+    authorizations = {user: frozenset(steps) for user, steps in authorizations.items()}
     return authorizations, separation_of_duty, binding_of_duty, at_most_k, one_team, user_capacity
 
 def parse_solution(filepath):
     """Parse solution from a text file."""
     solution = {}
     with open(filepath, 'r') as file:
-        lines = file.readlines()
+        lines = file.read().splitlines()
     for line in lines:
         if not line.strip():
             continue  # Skip empty lines
@@ -102,9 +132,22 @@ def validate_one_team(solution, one_team):
     """
     Validate that the steps are assigned to a valid team of users.
     """
-    for steps, teams in one_team:
-        assigned_users = [solution.get(step) for step in steps if solution.get(step)]
-        valid_team = any(all(user in team for user in assigned_users) for team in teams)
+    for steps, teams, team_masks, max_user in one_team:
+        assigned_users = [user for step in steps if (user := solution.get(f"s{step}"))]
+        assigned_mask = 0
+        for user in assigned_users:
+            try:
+                u = int(user[1:]) if user[:1] == 'u' and user[1:].isdigit() else None
+            except ValueError:
+                u = None  # more digits than int() accepts
+            if u is None or u > max_user:
+                # not a user id, or past every team: no team can contain it, and
+                # shifting by an unbounded id would build an arbitrarily wide mask
+                assigned_mask = -1
+                break
+            assigned_mask |= 1 << u
+        # the assigned users fit a team when none of them falls outside its mask
+        valid_team = any(assigned_mask & ~team_mask == 0 for team_mask in team_masks)
         if not valid_team:
             print(f"One-team violation: Steps {steps} assigned users {assigned_users} do not match any valid team {teams}.")
 